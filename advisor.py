@@ -0,0 +1,118 @@
+# Background advisor: evaluates a human player's options while the game waits for input
+import multiprocessing
+import queue
+import random
+import threading
+
+from bots import search
+from main import Course
+
+# ANSI sequences: save the cursor, go to the start of the line above and clear it / restore the cursor
+_SAVE_AND_UP = '\x1b7\x1b[1A\r\x1b[2K'
+_RESTORE = '\x1b8'
+
+def _adviseWorker(course: 'Course', color: str, rider_types: list, revealed: dict, settings: dict, seed: int, results: 'multiprocessing.Queue', stop: 'multiprocessing.Event') -> None:
+    '''
+    Worker process entry point: run short ISMCTS searches (see bots.search) until stopped,
+    sending the statistics accumulated so far after each of them
+    '''
+    stats = {}
+    while not stop.is_set():
+        for action, (visits, reward) in search(course, color, rider_types, revealed, settings, seed).items():
+            total = stats.setdefault(action, [0, 0.0])
+            total[0] += visits
+            total[1] += reward
+        results.put(stats)
+        if len(stats) == 1: # Only one option, nothing to improve
+            return
+        seed += 1
+
+def estimates(stats: dict, by_rider: bool = False) -> dict:
+    '''
+    Expected outcome (see bots.evaluate, 1.0 == winning) of every card, or of every rider (the outcome of its most visited card).
+    Returns {card or rider type: (expected outcome, iterations)}, best first
+    '''
+    options = {}
+    for (rider_type, card), (visits, reward) in stats.items():
+        key = rider_type if by_rider else card
+        if visits and (key not in options or visits > options[key][1]):
+            options[key] = (reward / visits, visits)
+    return dict(sorted(options.items(), key=lambda x: -x[1][0]))
+
+class Advisor():
+    '''
+    Anytime advice for a human player. start() launches a worker process that keeps searching the options of the player
+    (the cards of a rider, or which rider plays first) while the main process waits on input(). Every improved estimate is
+    written on the line above the prompt. stop() cancels the search as soon as the player commits.
+    update_interval is the length in seconds of each search between two updates.
+    '''
+    def __init__(self, update_interval: float = 0.3, horizon: int = 4, rollout: str = 'greedy', exploration: float = 0.7, seed: int = None) -> None:
+        self.settings = {
+            'iterations': 10**9,
+            'time_limit': update_interval,
+            'horizon': horizon,
+            'rollout': rollout,
+            'exploration': exploration,
+        }
+        self.rng = random.Random(seed)
+        self.latest = {} # Estimates of the last update
+        self._process = None
+        self._thread = None
+        self._stop = None
+
+    def __repr__(self) -> str:
+        return f"<Advisor {'running' if self._process else 'idle'}>"
+
+    def start(self, course: 'Course', riders: list, played: dict = None) -> None:
+        '''
+        Start evaluating the cards of the given riders (a single rider: its cards, several riders: which one to select).
+        Leaves an empty line for the estimates: call it right after printing the options and before the prompt
+        '''
+        self.stop()
+        self.latest = {}
+        revealed = {(rider.color, rider.type): value for rider, value in (played or {}).items()}
+        context = multiprocessing.get_context()
+        results = context.Queue()
+        self._stop = context.Event()
+        # The log and the profiler stay in this process
+        log, profiler = course.log, course.profiler
+        course.log = course.profiler = None
+        try:
+            self._process = context.Process(target=_adviseWorker, daemon=True,
+                                            args=(course, riders[0].color, [rider.type for rider in riders], revealed, self.settings,
+                                                  self.rng.getrandbits(32), results, self._stop))
+            self._process.start()
+        finally:
+            course.log, course.profiler = log, profiler
+        print()
+        self._thread = threading.Thread(target=self._show, args=(results, self._stop, len(riders) > 1), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''
+        Cancel the search (if any)
+        '''
+        if self._process is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._process.terminate()
+        self._process.join()
+        self._process = self._thread = self._stop = None
+
+    def _show(self, results: 'multiprocessing.Queue', stop: 'multiprocessing.Event', by_rider: bool) -> None:
+        '''
+        Write every update on the line above the prompt, until stopped
+        '''
+        while not stop.is_set():
+            try:
+                stats = results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self.latest = estimates(stats, by_rider)
+            print(_SAVE_AND_UP + self.format(self.latest) + _RESTORE, end='', flush=True)
+
+    @staticmethod
+    def format(options: dict) -> str:
+        iterations = sum(visits for _, visits in options.values())
+        return f'Advisor ({iterations} simulations): ' + ' | '.join(f"{'E' if option == -1 else option}: {outcome:.0%}" for option, (outcome, _) in options.items())
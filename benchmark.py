@@ -0,0 +1,273 @@
+# Benchmark suite for the rules engine and the console rendering
+import argparse
+import json
+import platform
+import random
+import time
+
+from main import Course, Race, POLICIES, PLAYER_COLORS, getCourses, simulateRace, _countRange
+from render import CourseRenderer
+
+# Benchmark functions, by name. Each one takes a seed and returns {case name: (seconds, operations)}
+BENCHMARKS = {}
+
+def benchmark(function: callable) -> callable:
+    '''
+    Register a benchmark function (its name without the leading "bench" is the group name)
+    '''
+    BENCHMARKS[function.__name__[len('bench'):].lower()] = function
+    return function
+
+def _newCourse(name: str, player_count: int, seed: int, place: bool = True) -> 'Course':
+    '''
+    Course with player_count players (riders placed at random, but reproducibly, if place is True)
+    '''
+    course = Course(name, _countRange(player_count), seed=seed)
+    for color in PLAYER_COLORS[:player_count]:
+        course.addPlayer(color)
+    if place:
+        Race(course, {color: POLICIES['random']() for color in PLAYER_COLORS[:player_count]}).placeRiders()
+    return course
+
+def _pack(course: 'Course', first: int, breakaway: bool = False) -> None:
+    '''
+    Place every rider on consecutive spaces from first, filling every lane.
+    With breakaway, the last rider goes alone one empty space ahead of the others (so the whole pack can slipstream)
+    '''
+    riders = [rider for player in course.players for rider in (player.sprinteur, player.rouleur)]
+    leader = riders.pop() if breakaway else None
+    space = first
+    for rider in riders:
+        while not course._free[space]:
+            space += 1
+        course._placeRider(rider, space)
+    if leader:
+        course._placeRider(leader, space+2)
+
+@benchmark
+def benchCourse(seed: int) -> dict:
+    '''
+    Course construction for every entry (and player count variant) of courses.json.
+    Each variant is built once before timing, so the cached layouts are warm for every entry whatever the run order
+    '''
+    results = {}
+    for name, variants in getCourses().items():
+        for player_count in variants:
+            Course(name, player_count, seed=seed)
+            start = time.perf_counter()
+            for i in range(20):
+                Course(name, player_count, seed=seed+i)
+            results[f'{name} ({player_count})'] = (time.perf_counter() - start, 20)
+    return results
+
+@benchmark
+def benchMove(seed: int) -> dict:
+    '''
+    Single Course.moveRider calls on an empty board (a lone rider) and on a congested board (12 riders in a pack)
+    '''
+    rng = random.Random(seed)
+    elapsed = operations = 0
+    for i in range(50):
+        course = _newCourse('La Classicissima', 2, seed+i, place=False)
+        rider = course.players[0].sprinteur
+        course._placeRider(rider, 0)
+        # Only as many moves as fit on the course (a rider on the last space would not move anymore)
+        cards, space = [], 0
+        for _ in range(30):
+            card = rng.choice(rider.draw_deck)
+            space = course.layout.target(space, card)
+            if space == course.layout.size-1:
+                break
+            cards.append(card)
+        start = time.perf_counter()
+        for card in cards:
+            course.moveRider(rider, card)
+        elapsed += time.perf_counter() - start
+        operations += len(cards)
+    results = {'empty board': (elapsed, operations)}
+
+    elapsed = operations = 0
+    for i in range(50):
+        course = _newCourse('Stage 7', 6, seed+i, place=False)
+        _pack(course, 10)
+        riders = list(course.movementOrder())
+        cards = [rng.choice((2, 3, 4, 5)) for _ in riders]
+        start = time.perf_counter()
+        for rider, card in zip(riders, cards):
+            course.moveRider(rider, card)
+        elapsed += time.perf_counter() - start
+        operations += len(riders)
+    results['congested board'] = (elapsed, operations)
+    return results
+
+@benchmark
+def benchSlip(seed: int) -> dict:
+    '''
+    Course._applySlip on long pelotons (up to 11 riders) one empty space behind a lone rider
+    '''
+    results = {}
+    for player_count in (3, 6):
+        elapsed = 0
+        for i in range(100):
+            course = _newCourse('Stage 7', player_count, seed+i, place=False)
+            _pack(course, 10, breakaway=True)
+            start = time.perf_counter()
+            course._applySlip()
+            elapsed += time.perf_counter() - start
+        results[f'peloton of {player_count*2 - 1} riders'] = (elapsed, 100)
+    return results
+
+@benchmark
+def benchDeck(seed: int) -> dict:
+    '''
+    Drawing a hand (and playing one card from it) until the deck runs out, and reshuffling the discard pile
+    '''
+    draw_time = draws = reshuffle_time = reshuffles = 0
+    for i in range(300):
+        course = _newCourse('La Classicissima', 2, seed+i, place=False)
+        rider = course.players[0].rouleur
+        # Every card played leaves the game, so 12 turns go through the deck (and the reshuffles) almost to the end
+        start = time.perf_counter()
+        for _ in range(12):
+            rider.playCard(0)
+            rider.drawCards()
+        draw_time += time.perf_counter() - start
+        draws += 12
+        rider = course.players[0].sprinteur
+        rider.discard_deck.extend(rider.draw_deck)
+        rider.draw_deck.clear()
+        start = time.perf_counter()
+        rider.reshuffleDeck()
+        reshuffle_time += time.perf_counter() - start
+        reshuffles += 1
+    return {'draw': (draw_time, draws), 'reshuffle': (reshuffle_time, reshuffles)}
+
+@benchmark
+def benchRace(seed: int) -> dict:
+    '''
+    Full headless races (4 players) with each built-in policy
+    '''
+    results = {}
+    for policy_name in ('random', 'greedy', 'lazy'):
+        start = time.perf_counter()
+        for i in range(30):
+            simulateRace('La Classicissima', 4, [policy_name]*4, seed+i)
+        results[policy_name] = (time.perf_counter() - start, 30)
+    return results
+
+@benchmark
+def benchRender(seed: int) -> dict:
+    '''
+    Drawing the course: full frames on a new renderer, incremental frames after every turn and ANSI changes only
+    '''
+    full = incremental = changes = frames = 0
+    for i in range(20):
+        course = _newCourse('La Classicissima', 4, seed+i)
+        race = Race(course, {color: POLICIES['random']() for color in PLAYER_COLORS[:4]})
+        renderer = CourseRenderer(course)
+        ansi_renderer = CourseRenderer(course)
+        ansi_renderer.render()
+        while not race.playTurn():
+            start = time.perf_counter()
+            CourseRenderer(course).render()
+            full += time.perf_counter() - start
+            start = time.perf_counter()
+            renderer.render()
+            incremental += time.perf_counter() - start
+            start = time.perf_counter()
+            ansi_renderer.renderChanges()
+            changes += time.perf_counter() - start
+            frames += 1
+    return {'full frame': (full, frames), 'incremental frame': (incremental, frames), 'ANSI changes': (changes, frames)}
+
+@benchmark
+def benchScaling(seed: int) -> dict:
+    '''
+    Time per race over player count (same course) and over course length (4 players, the middle tiles of
+    La Classicissima repeated 1 to 4 times)
+    '''
+    results = {}
+    for player_count in range(2, 7):
+        start = time.perf_counter()
+        for i in range(20):
+            simulateRace('Stage 7', player_count, ['greedy']*player_count, seed+i)
+        results[f'{player_count} players'] = (time.perf_counter() - start, 20)
+    tile_ids = getCourses()['La Classicissima']['2-4']
+    for copies in range(1, 5):
+        tiles = tile_ids[:1] + tile_ids[1:-1]*copies + tile_ids[-1:]
+        start = time.perf_counter()
+        for i in range(20):
+            course = Course('La Classicissima', '2-4', seed=seed+i, tiles=tiles)
+            for color in PLAYER_COLORS[:4]:
+                course.addPlayer(color)
+            Race(course, {color: POLICIES['greedy']() for color in PLAYER_COLORS[:4]}, max_turns=1000).run()
+        results[f'{len(course.spaces)} spaces'] = (time.perf_counter() - start, 20)
+    return results
+
+def runBenchmarks(groups: list = None, seed: int = 0, repeat: int = 3) -> dict:
+    '''
+    Run the given benchmark groups (default: all) repeat times with the same seed.
+    Returns {"group/case": best seconds per operation}
+    '''
+    results = {}
+    for group in groups or BENCHMARKS:
+        for _ in range(repeat):
+            for case, (seconds, operations) in BENCHMARKS[group](seed).items():
+                key = f'{group}/{case}'
+                results[key] = min(results.get(key, float('inf')), seconds / operations)
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.1) -> list:
+    '''
+    List of (case, baseline seconds, current seconds, ratio) for the cases found in both, and whether the case
+    regressed (ratio above 1 + tolerance)
+    '''
+    rows = []
+    for case, seconds in results.items():
+        if case in baseline:
+            ratio = seconds / baseline[case]
+            rows.append((case, baseline[case], seconds, ratio, ratio > 1 + tolerance))
+    return rows
+
+def _format(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds/scale:.2f} {unit}'
+    return f'{seconds/1e-9:.0f} ns'
+
+def main():
+    '''
+    Run the benchmark suite, optionally saving the results as a baseline or comparing them with one
+    '''
+    parser = argparse.ArgumentParser(description='Benchmark the Flamme Rouge engine.')
+    parser.add_argument('groups', nargs='*', help=f'benchmark groups to run (default: all): {", ".join(BENCHMARKS)}')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per group (the best time of each case is kept)')
+    parser.add_argument('--save', metavar='PATH', help='store the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare the results with a stored baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='slowdown reported as a regression (default: 0.1 == 10%%)')
+    args = parser.parse_args()
+    for group in args.groups:
+        if group not in BENCHMARKS:
+            parser.error(f'unknown benchmark group: {group}')
+
+    results = runBenchmarks(args.groups, args.seed, args.repeat)
+    regressions = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        for case, before, after, ratio, regressed in compare(results, baseline, args.tolerance):
+            regressions += regressed
+            print(f'{case:<50} {_format(before):>10} -> {_format(after):>10}  {ratio:5.2f}x{"  REGRESSION" if regressed else ""}')
+    else:
+        for case, seconds in results.items():
+            print(f'{case:<50} {_format(seconds):>10}')
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'seed': args.seed, 'results': results}, f, indent=2)
+    if regressions:
+        raise SystemExit(f'{regressions} regression(s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+# Compact board state
+from array import array
+
+from main import Course
+
+# Widest space in any tile. Every space takes this many cells in the occupancy grid
+MAX_LANES = 3
+# Grid value of an empty lane
+EMPTY = -1
+
+class Board():
+    '''
+    Alternative representation of the board state of a Course, using flat arrays instead of Space and Rider objects.
+    Riders are identified by small integer ids (their index in self.riders).
+        grid: occupancy of every (space, lane), holds a rider id or EMPTY. Cell of a lane is space*MAX_LANES + lane
+        space / lane: position of every rider (space -1 == not yet on the board)
+    Space attributes (lanes, min/max power, slip, finish) are stored in arrays shared by every copy of the board,
+    so copying a board only copies a few hundred bytes.
+    Movement rules are the same as Course.moveRider, Course._applySlip and Course._applyExhaustion.
+    '''
+    def __init__(self, spaces: list, riders: list) -> None:
+        self.riders = tuple(riders)
+        # Static space attributes
+        self.size = len(spaces)
+        self.lanes = array('b', [len(space.lanes) for space in spaces])
+        self.min_pw = array('b', [space.min_pw for space in spaces])
+        self.max_pw = array('b', [space.max_pw for space in spaces])
+        self.slip = array('b', [space.slip for space in spaces])
+        self.finish = array('b', [space.type == 'finish' for space in spaces])
+        # Dynamic state
+        self.grid = array('b', [EMPTY]) * (self.size*MAX_LANES)
+        self.space = array('h', [-1]) * len(self.riders)
+        self.lane = array('b', [0]) * len(self.riders)
+
+    def __repr__(self) -> str:
+        return f"<Board {self.size} spaces - {len(self.riders)} riders>"
+
+    @classmethod
+    def fromCourse(cls, course: 'Course') -> 'Board':
+        '''
+        Snapshot the current state of a Course. Rider ids follow the order of course.players (sprinteur, then rouleur)
+        '''
+        riders = []
+        for player in course.players:
+            riders.extend([player.sprinteur, player.rouleur])
+        board = cls(course.spaces, riders)
+        for rider_id, rider in enumerate(riders):
+            board.space[rider_id], board.lane[rider_id] = rider.location
+        for space_index, space in enumerate(course.spaces):
+            for lane_index, rider in enumerate(space.lanes):
+                if rider is not None:
+                    board.grid[space_index*MAX_LANES + lane_index] = riders.index(rider)
+        return board
+
+    def copy(self) -> 'Board':
+        '''
+        Copy the dynamic state. Static space attributes are shared.
+        '''
+        new_board = Board.__new__(Board)
+        new_board.__dict__.update(self.__dict__)
+        new_board.grid = self.grid[:]
+        new_board.space = self.space[:]
+        new_board.lane = self.lane[:]
+        return new_board
+
+    def key(self) -> bytes:
+        '''
+        Bytes representation of the dynamic state (usable as a dict key)
+        '''
+        return self.grid.tobytes() + self.space.tobytes() + self.lane.tobytes()
+
+    def restore(self, key: bytes) -> None:
+        '''
+        Set the dynamic state from the output of key()
+        '''
+        grid_end = len(self.grid)
+        space_end = grid_end + len(self.space)*self.space.itemsize
+        self.grid = array('b', key[:grid_end])
+        self.space = array('h')
+        self.space.frombytes(key[grid_end:space_end])
+        self.lane = array('b', key[space_end:])
+
+    def location(self, rider_id: int) -> tuple:
+        return self.space[rider_id], self.lane[rider_id]
+
+    def order(self) -> list:
+        '''
+        Rider ids sorted by position (front to back). Same order as Course.riders
+        '''
+        return sorted(range(len(self.riders)), key=lambda x: (self.space[x], -self.lane[x]), reverse=True)
+
+    def placeRider(self, rider_id: int, target: int) -> tuple:
+        '''
+        Place a rider in the first free lane of target space, or of the first space before it with a free lane.
+        Returns final location of rider
+        '''
+        origin = self.space[rider_id]
+        if target < origin:
+            raise ValueError(f'{self.riders[rider_id]} cannot go backwards.')
+        grid = self.grid
+        while target > origin:
+            cell = target*MAX_LANES
+            for lane in range(self.lanes[target]):
+                if grid[cell+lane] == EMPTY:
+                    grid[cell+lane] = rider_id
+                    if origin != -1: # Erase current location (but not if being placed for first time)
+                        self._updateSpace(origin, self.lane[rider_id])
+                    self.space[rider_id], self.lane[rider_id] = target, lane
+                    return target, lane
+            target -= 1
+        return origin, self.lane[rider_id]
+
+    def _updateSpace(self, space: int, lane: int) -> None:
+        '''
+        Erase a rider from a space and move riders on the lanes to its left one lane to the right
+        '''
+        grid = self.grid
+        cell = space*MAX_LANES
+        grid[cell+lane] = EMPTY
+        for i in range(lane+1, self.lanes[space]):
+            rider_id = grid[cell+i]
+            if rider_id != EMPTY:
+                grid[cell+i-1], grid[cell+i] = rider_id, EMPTY
+                self.lane[rider_id] = i-1
+
+    def removeRider(self, rider_id: int) -> None:
+        '''
+        Take a rider off the board (after crossing the finish line). Its position is kept.
+        '''
+        self.grid[self.space[rider_id]*MAX_LANES + self.lane[rider_id]] = EMPTY
+
+    def moveRider(self, rider_id: int, delta: int) -> tuple:
+        '''
+        Try to move rider a given number of spaces.
+        Returns the location where they actually end up
+        '''
+        origin = self.space[rider_id]
+        if delta != 1: # Speed limits don't apply to slipstream
+            delta = max(self.min_pw[origin], min(self.max_pw[origin], delta))
+        return self.placeRider(rider_id, min(origin + delta, self.size-1))
+
+    def getPelotons(self) -> list:
+        '''
+        List of (start, end, rider ids) for each group of riders on consecutive spaces, from back to front.
+        Riders of each peloton are listed front to back. Same rules as Course._getPelotons.
+        '''
+        pelotons = []
+        grid = self.grid
+        peloton = []
+        start = 0
+        for i in range(self.size):
+            cell = i*MAX_LANES
+            riders_on_this_space = [rider_id for rider_id in grid[cell:cell+self.lanes[i]] if rider_id != EMPTY]
+            if riders_on_this_space:
+                if not peloton:
+                    start = i
+                peloton = riders_on_this_space + peloton
+            elif peloton:
+                pelotons.append((start, i-1, peloton))
+                peloton = []
+        if peloton:
+            pelotons.append((start, self.size-1, peloton))
+        return pelotons
+
+    def applySlip(self) -> None:
+        '''
+        Move riders according to slipstreaming rules, until no peloton can move anymore
+        '''
+        while True:
+            pelotons = self.getPelotons()
+            any_rider_moved = False
+            for (_, this_peloton_end, riders), (next_peloton_start, _, _) in zip(pelotons, pelotons[1:]):
+                if this_peloton_end+2 == next_peloton_start and self.slip[next_peloton_start]:
+                    for rider_id in riders:
+                        # If space where rider is does not allow slipstream, them and all behind don't move
+                        if not self.slip[self.space[rider_id]]:
+                            break
+                        self.moveRider(rider_id, 1)
+                        any_rider_moved = True
+                    if any_rider_moved:
+                        break
+            if not any_rider_moved:
+                return
+
+    def applyExhaustion(self, rider_id: int) -> bool:
+        '''
+        Return True if the lane ahead of the rider is empty (i.e. the rider should draw an exhaustion card)
+        '''
+        space, lane = self.space[rider_id], self.lane[rider_id]
+        if space+1 <= self.size-1:
+            lane_ahead = min(lane, self.lanes[space+1]-1)
+            return self.grid[(space+1)*MAX_LANES + lane_ahead] == EMPTY
+        return False
+
+    def checkFinish(self, rider_id: int) -> bool:
+        return bool(self.finish[self.space[rider_id]])
@@ -0,0 +1,199 @@
+# Computer players
+import copy
+import math
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from main import Course, Player, Policy, POLICIES, Race, Rider
+
+class MCTSPolicy(Policy):
+    '''
+    Computer player based on information set Monte Carlo tree search (ISMCTS) with a single decision layer.
+    Each decision (which rider plays first and which card it plays) is chosen by UCB1 over the possible actions.
+    Every iteration samples the hidden information (deck order, opponents' hands and cards not revealed yet),
+    plays the action, completes the turn plus a few more turns with a fast rollout policy on a private copy of the course,
+    scores the result and reverts everything with Course.undo().
+    The budget per decision is a number of iterations and/or a time limit in seconds.
+    With workers > 1, independent searches run in a process pool and their statistics are added up (root parallelisation).
+    '''
+    name = 'mcts'
+
+    def __init__(self, iterations: int = 5000, time_limit: float = 0.5, horizon: int = 4, rollout: str = 'greedy', exploration: float = 0.7, workers: int = 1, seed: int = None) -> None:
+        self.settings = {
+            'iterations': iterations,
+            'time_limit': time_limit,
+            'horizon': horizon,
+            'rollout': rollout,
+            'exploration': exploration,
+        }
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self._planned = None # (rider, card) chosen by selectRider, played by the next selectCard
+        self._executor = None
+
+    def __repr__(self) -> str:
+        return f"<MCTSPolicy {self.settings} - {self.workers} workers>"
+
+    def close(self) -> None:
+        '''
+        Shut down the worker processes (if any)
+        '''
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+
+    def placeRider(self, course: 'Course', rider: 'Rider', valid_positions: list) -> int:
+        '''
+        Start as far ahead as possible
+        '''
+        return max(valid_positions)
+
+    def selectRider(self, course: 'Course', player: 'Player', selectable: list, played: dict = None) -> 'Rider':
+        self._planned = self._search(course, player.color, selectable, played)
+        return self._planned[0]
+
+    def selectCard(self, course: 'Course', rider: 'Rider', played: dict = None) -> int:
+        if self._planned and self._planned[0] is rider:
+            card = self._planned[1]
+        else:
+            card = self._search(course, rider.color, [rider], played)[1]
+        self._planned = None
+        return rider.hand.index(card)
+
+    def _search(self, course: 'Course', color: str, riders: list, played: dict) -> tuple:
+        '''
+        Return the best (rider, card) for the given riders
+        '''
+        revealed = {(rider.color, rider.type): value for rider, value in (played or {}).items()}
+        args = (course, color, [rider.type for rider in riders], revealed, self.settings)
+        if self.workers > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            seeds = [self.rng.getrandbits(32) for _ in range(self.workers)]
+            stats = {}
+            # The log and the profiler stay in this process (the course is pickled for every worker)
+            log, profiler = course.log, course.profiler
+            course.log = course.profiler = None
+            try:
+                for worker_stats in self._executor.map(_searchWorker, [args + (seed,) for seed in seeds]):
+                    for action, (visits, reward) in worker_stats.items():
+                        total = stats.setdefault(action, [0, 0.0])
+                        total[0] += visits
+                        total[1] += reward
+            finally:
+                course.log, course.profiler = log, profiler
+        else:
+            stats = search(*args, self.rng.getrandbits(32))
+        rider_type, card = max(stats, key=lambda action: (stats[action][0], stats[action][1]))
+        return next(rider for rider in riders if rider.type == rider_type), card
+
+def _searchWorker(args: tuple) -> dict:
+    return search(*args)
+
+def search(course: 'Course', color: str, rider_types: list, revealed: dict, settings: dict, seed: int) -> dict:
+    '''
+    Run one ISMCTS search for the player of the given color, choosing among the cards of its riders of the given types.
+    revealed maps (color, rider type) to the movement value of the cards already revealed this turn.
+    The course is not modified.
+    Returns {(rider type, card): [visits, total reward]}
+    '''
+    # Rollouts are neither logged nor profiled: the log and the profiler are left out of the copy
+    live = course
+    log, profiler = live.log, live.profiler
+    live.log = live.profiler = None
+    try:
+        course = copy.deepcopy(live)
+    finally:
+        live.log, live.profiler = log, profiler
+    course.rng.seed(seed)
+    rng = course.rng
+    riders = {(rider.color, rider.type): rider for rider in course.riders}
+    own = [riders[(color, rider_type)] for rider_type in rider_types]
+    finished = {rider for rider, _ in course.final_positions}
+    stats = {(rider.type, card): [0, 0.0] for rider in own for card in set(rider.hand)}
+    if len(stats) == 1:
+        return {action: [1, 0.0] for action in stats}
+
+    # Riders that already played this turn, but whose card is unknown (their hand has already been discarded)
+    hidden = [rider for rider in course.riders if rider not in finished and not rider.hand and (rider.color, rider.type) not in revealed]
+    race = Race(course, {player.color: POLICIES[settings['rollout']]() for player in course.players})
+    exploration = settings['exploration']
+    deadline = time.perf_counter() + settings['time_limit'] if settings['time_limit'] else None
+
+    # Rollouts go on from the turn being played, so finishing turns are those of the live race
+    race.turn = course.turn + 1
+    course.startRecording()
+    for iteration in range(settings['iterations']):
+        if deadline and time.perf_counter() > deadline:
+            break
+        _determinize(course, own, finished, rng)
+
+        # Pick action with UCB1 (untried actions first)
+        log_total = math.log(iteration+1)
+        action = max(stats, key=lambda x: float('inf') if not stats[x][0] else stats[x][1]/stats[x][0] + exploration*math.sqrt(log_total/stats[x][0]))
+        rider = riders[(color, action[0])]
+
+        # Complete this turn: revealed cards, chosen action, hidden cards and cards of riders that did not play yet
+        played_cards = {other: None for other in course.riders}
+        for key, value in revealed.items():
+            played_cards[riders[key]] = value
+        played_cards[rider] = course.playCard(rider, rider.hand.index(action[1]))
+        for other in hidden:
+            card = rng.choice(list(other.draw_deck) + other.discard_deck or [-1])
+            played_cards[other] = 2 if card == -1 else card
+        for other in course.riders:
+            if other not in finished and played_cards[other] is None and other.hand:
+                card_index = race.policies[other.color].selectCard(course, other)
+                played_cards[other] = course.playCard(other, card_index)
+
+        # Rollout
+        ended = race.resolveCards(played_cards)
+        for _ in range(settings['horizon']):
+            if ended:
+                break
+            ended = race.playTurn()
+
+        stats[action][0] += 1
+        stats[action][1] += evaluate(course, color)
+        # Back to the state before the iteration (only the hidden information stays resampled)
+        while course._undo_stack:
+            course.undo()
+        race.turn = course.turn + 1
+    return stats
+
+def _determinize(course: 'Course', own: list, finished: set, rng: random.Random) -> None:
+    '''
+    Sample the information the searching player can't see: the order of every draw deck and the opponents' hands
+    '''
+    for rider in course.riders:
+        if rider in finished:
+            continue
+        if rider in own or not rider.hand:
+            rng.shuffle(rider.draw_deck)
+        else:
+            pool = rider.hand + list(rider.draw_deck)
+            rng.shuffle(pool)
+            rider.hand[:] = pool[:len(rider.hand)]
+            rider.draw_deck = deque(pool[len(rider.hand):])
+
+def evaluate(course: 'Course', color: str) -> float:
+    '''
+    Score of a player: 1 minus the share of opponent riders ahead of its best rider
+    (riders that finished come first, in arrival order). 1.0 == winning
+    '''
+    done = {rider for rider, _ in course.final_positions}
+    order = [rider for rider, _ in course.final_positions] + [rider for rider in course.riders if rider not in done]
+    ahead = 0
+    for rider in order:
+        if rider.color == color:
+            break
+        ahead += 1
+    return 1 - ahead / (len(order)-2)
+
+def registerPolicies() -> None:
+    '''
+    Make the computer players of this module available by name (see main.POLICIES), e.g. to headless races
+    '''
+    POLICIES[MCTSPolicy.name] = MCTSPolicy
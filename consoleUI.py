@@ -1,7 +1,14 @@
 # Console interface
-from main import Course, Player, Rider
-from console import fg, bg, fx
+import argparse
 import json
+import socket
+from main import Course, PLAYER_COLORS, getCourses, getLayout, _countRange
+from game import Game
+from bots import MCTSPolicy
+from placement import bestPlacements, report, shutdown
+from advisor import Advisor
+from render import CourseRenderer
+from console import fg, bg, fx
 from typing import Union
 
 # Make black color readable on console
@@ -9,64 +16,28 @@ fg.black = fg.darkgray
 
 class App():
     '''
-    Main class for IO and implementing the game loop
+    Console client of a local game (see game.Game): sets the game up, shows its events and prompts human players for their decisions
     '''
-    player_colors = ['blue', 'green', 'red', 'pink', 'white', 'black']
-    def __init__(self) -> None:
+    player_colors = PLAYER_COLORS
+    def __init__(self, placement_hints: bool = False, advice: bool = False) -> None:
+        # Computer players (color -> policy)
+        self.bots = {}
+        # Show the simulated win rate of every start space before a human places a rider (see placement.bestPlacements)
+        self.placement_hints = placement_hints
+        # Evaluates the options of human players in the background while they choose (see advisor.Advisor)
+        self.advisor = Advisor() if advice else None
+        # Riders on the grid so far ((color, rider type, space) in placement order) and cards revealed this turn, as strings
+        self._placed = []
+        self._cards_played_last_round = []
         # Series of prompts to set up the game
         self.setUp()
 
     def drawCourse(self) -> str: 
         '''
         Build a string representation of the board state (as a straight line)
-        Use three lines (one for each potential lane)
+        Use three lines (one for each potential lane). Only spaces touched since the last frame are re-rendered
         '''
-        first_line = second_line = third_line =  '>'
-        for i, space in enumerate(self.course.spaces):
-            if space.type == 'uphill':
-                sq = ' ' + fg.red + '|' + fx.default
-            elif space.type == 'downhill':
-                sq = ' ' + fg.blue + '|' + fx.default
-            elif space.type == 'cobble':
-                sq = ' ' + fg.yellowgreen + '|' + fx.default
-            elif space.type == 'supply':
-                sq = ' ' + fg.cyan + '|' + fx.default
-            elif space.type in ['start', 'finish']:
-                sq = ' ' + fg.yellow + '|' + fx.default
-            else:
-                sq = ' ' + fx.default + '|'
-            
-            if len(space.lanes) == 3:
-                if space.lanes[2]:
-                    first_line += sq.replace(' ', getattr(fg, space.lanes[2].color) + space.lanes[2].type[0])
-                else:
-                    first_line += sq
-            else:
-                first_line += '  '
-
-            if len(space.lanes) >= 2:
-                if space.type == 'breakaway' and len(space.lanes) == 3: # Color breakaway lane
-                    sq = ' ' + fg.goldenrod + '|' + fx.default
-                if space.lanes[1]:
-                    second_line += sq.replace(' ', getattr(fg, space.lanes[1].color) + space.lanes[1].type[0])
-                else:
-                    second_line += sq
-            else:
-                second_line += '  '
-
-            if space.type == 'breakaway': # Color breakaway lane
-                sq = ' ' + fg.goldenrod + '|' + fx.default
-            if space.lanes[0]:
-                third_line += sq.replace(' ', getattr(fg, space.lanes[0].color) + space.lanes[0].type[0])
-            else:
-                third_line += sq
-
-        border = '#'*(len(self.course.spaces)*2+1)
-        if not first_line.count('|'): # No spaces have three lanes. No need to draw first line.
-            final_string = '\n'.join([border, second_line, third_line, border])    
-        else:
-            final_string = '\n'.join([border, first_line, second_line, third_line, border])
-        return final_string
+        return self.renderer.render()
     
     def _choosePlayerCount(self) -> int:
         '''
@@ -75,19 +46,15 @@ class App():
         player_count = getInput('How many players (or [q]uit)?', '23456', 'q')
         return int(player_count)
 
-    def _chooseCourse(self) -> 'Course':
+    def _chooseCourse(self) -> str:
         '''
-        Select a Course and return it as an object
+        Select a Course and return its name
         '''
         # Get player count range string (used as key when selecting a course)
-        if self.player_count <= 4:
-            count_range = '2-4'
-        else:
-            count_range = '5-6'
+        count_range = _countRange(self.player_count)
         
-        # Load courses from file
-        with open(r'data\courses.json') as file:
-            courses = json.load(file)
+        # Get courses from the data registry
+        courses = getCourses()
         
         # Print each course name and index
         choices = ''
@@ -98,36 +65,39 @@ class App():
         chosen_course = getInput('Choose one of the courses above:', choices, 'q')
         # Get chosen course name
         course_name = list(courses.keys())[int(chosen_course)-1]
-        try:
-            # Create course object. Might fail if there is no version for the chosen player count
-            return Course(course_name, count_range)
-        except KeyError:
+        # There might be no version for the chosen player count
+        if count_range not in courses[course_name]:
             input(f'{course_name} does not have a version for this player count: {count_range}. Press Enter to try again...')
             return self._chooseCourse()
+        if getLayout(tuple(courses[course_name][count_range])).startRoom() < self.player_count * 2:
+            input(f'The start of {course_name} is too small for {self.player_count} players. Press Enter to try again...')
+            return self._chooseCourse()
+        return course_name
 
-    def _addPlayers(self) -> None:
+    def _addPlayers(self) -> list:
         '''
-        Add one player per player count.
-        Colors are chosen from the class variable player_colors
+        Choose one color per player (from the class variable player_colors) and whether a human or a computer plays it.
+        Returns the colors in seat order
         '''
-        selected = set()
-        while len(selected) < self.player_count:
-            # Print options
+        colors = []
+        while len(colors) < self.player_count:
+            # Print options, skipping colors that have been selected already
+            valid_choices = []
             for i, color in enumerate(self.player_colors):
-                # Skip a color that has been selected already
-                if i in selected:
+                if color in colors:
                     continue
                 print(i+1, '-', color)
+                valid_choices.append(str(i+1))
             
             # Prompt user for choice of a color index
-            # Get list of valid choices
-            valid_choices = [str(i+1) for i in range(len(self.player_colors)) if i not in selected]
-            selected_index = getInput(f'Player {len(selected)+1}, select a color above:', valid_choices, 'q')
-            # Add selected index to set (subtracting 1 to get actual index)
-            selected.add(int(selected_index)-1)
-            # Get color name and add player object of that color
+            selected_index = getInput(f'Player {len(colors)+1}, select a color above:', valid_choices, 'q')
             selected_color = self.player_colors[int(selected_index)-1]
-            self.course.addPlayer(selected_color)
+            colors.append(selected_color)
+            # Seat can be filled by a computer player
+            player_type = getInput(f'Is player {selected_color} a [h]uman or a [c]omputer?', 'hc', 'q', color=selected_color)
+            if player_type == 'c':
+                self.bots[selected_color] = MCTSPolicy(time_limit=0.8)
+        return colors
 
     def setUp(self) -> None:
         '''
@@ -136,179 +106,108 @@ class App():
         # Ask for input and set player count
         self.player_count = self._choosePlayerCount()
         # Ask for input and choose course
-        self.course = self._chooseCourse()
+        course_name = self._chooseCourse()
         # Add players
-        self._addPlayers()
-
-    def _initialPlacement(self) -> None:
-        '''
-        Gets input from players to place their riders behind the start line
-        '''
-        valid_start_pos = [str(self.course.spaces.index(space)) for space in self.course.spaces if space.type in ['start', 'breakaway']]
-        for player in self.course.players:
-            for rider in [player.sprinteur, player.rouleur]:
-                print(self.drawCourse())
-                print('Valid positions: ', ' | '.join(valid_start_pos))
-                start_pos = getInput(f'Player {player.color}, place your {rider.type}: ', valid_start_pos, 'q', color=player.color)
-                self.course._placeRider(rider, int(start_pos))
-                # If bemove breakaway position selected, remove it from list.
-                # Otherwise when selecting an already taken position, riders will just be placed on the next available lane or space
-                if start_pos == '9': # Breakaway tiles are always on index 9 of the course
-                    if sum(isinstance(x, Rider) for x in self.course.spaces[9].lanes) == len(self.course.spaces[9].lanes)-1:
-                        valid_start_pos.remove('9')
-
-    def _cardSelectionRounds(self) -> dict:
-        '''
-        Have each player select one rider ande play one card.
-        Return a dictionary with riders as keys and movement values as values.
-        '''
-        # Initialize dict of riders and played cards
-        riders_and_cards = {rider: None for rider in self.course.riders}
-        # Initialize string representation of cards played after first round
-        cards_played_last_round = []
-        for i in range(2):
-            for player in self.course.players:
-                # Print board
-                print(self.drawCourse())
-                
-                # Get rider selection
-                rider_selected = self.selectRider(player, riders_and_cards)
-                # If there are no riders left to select, skip to next player
-                if not rider_selected:
-                    continue
-                
-                # If on second round, display cards played so far before playing a card
-                if i == 1:
-                    print('Cards played so far: ', ' | '.join(cards_played_last_round), sep='')
-                # Select a card (return card index in rider's hand)
-                card_index = self.selectCard(rider_selected)
-                
-                # Build string representation of rider and his played card
-                if i == 0: # Can't display cards as they are played during second round
-                    rider_as_str = _colorWrapper(rider_selected.type, rider_selected.color)
-                    if rider_selected.hand[card_index] == -1: # Display an E instead of -1 for exhaustion cards
-                        card_as_str = 'E'    
-                    else:
-                        card_as_str = str(rider_selected.hand[card_index])
-                    cards_played_last_round.append(rider_as_str + ': ' + card_as_str)
-                
-                # Play the card and assign its move value to return variable
-                move_value = rider_selected.playCard(card_index)
-                riders_and_cards[rider_selected] = move_value
-
-        return riders_and_cards
+        colors = self._addPlayers()
+        self.game = Game(course_name, self.player_count, self.bots, colors=colors)
+        self.course = self.game.course
+        self.renderer = CourseRenderer(self.course)
 
     def gameLoop(self) -> list:
         '''
-        Main game loop.
-        Returns the final positions after race is over
+        Main game loop: prompt human players until the race is over.
+        Returns the final positions
         '''
         print(f'The race is about to begin! Course: {self.course.name}')
-        # Initial placement of riders
-        self._initialPlacement()
-
-        # Initialize turn counter (is an instance variable so we can know on which turn each rider finishes)
-        self.turn = 1
-        while True:
-            print(_colorWrapper(f'Starting turn {self.turn}...', 'lightsalmon'))
-            # Card selection and play loop
-            played_cards = self._cardSelectionRounds()
-
-            # Move riders in order and get string representation of played cards
-            played_cards_as_str = []
-            for rider in self.course.riders:
-                delta = played_cards[rider]
-                if delta: # If rider already finished, delta will be None
-                    self.course.moveRider(rider, delta)
-                    played_cards_as_str.append(_colorWrapper(rider.type, rider.color) + ': ' + str(delta))
+        try:
+            for event in self.game.start():
+                self.handle(event)
+            while not self.game.over:
+                decision = self.game.pending
+                for event in self.game.submit(decision['color'], self.prompt(decision)):
+                    self.handle(event)
+        finally:
+            # Worker processes of the placement hints
+            shutdown()
+        return self.course.final_positions
 
-            # Redraw board and wait for Enter to apply slipstream
+    def handle(self, event: dict) -> None:
+        '''
+        Show an event of the game
+        '''
+        kind = event['event']
+        if kind == 'placed':
+            self._placed.append((event['color'], event['type'], event['location'][0]))
+        elif kind == 'turn':
+            self._cards_played_last_round = []
+            print(_colorWrapper(f"Starting turn {event['turn']}...", 'lightsalmon'))
+        elif kind == 'revealed':
+            self._cards_played_last_round = [_colorWrapper(card['type'], card['color']) + ': ' + str(card['value']) for card in event['cards']]
+        elif kind == 'resolved':
+            played_cards_as_str = [_colorWrapper(card['type'], card['color']) + ': ' + str(card['value']) for card in event['cards']]
             print('Moved this turn (before inclination effects): ', ' | '.join(played_cards_as_str))
+            if event['slipped']:
+                print('Slipstream: ' + ', '.join(_colorWrapper(rider['type'], rider['color']) for rider in event['slipped']))
             print(self.drawCourse())
-            input(_colorWrapper('Riders have moved! Press Enter to apply slipstream...', 'lightsalmon'))
-
-            # Apply slipstream
-            self.course._applySlip()
-            print(self.drawCourse())
-            input(_colorWrapper('Slipstream applied! Press Enter to continue...', 'lightsalmon'))
-
-            # Check if riders are finished already
-            for rider in self.course.riders:
-                is_finished = self.course._checkFinish(rider)
-                if is_finished:
-                    # If finished, add to final_positions and remove from board
-                    if rider not in [r[0] for r in self.course.final_positions]:
-                        self.course.final_positions.append([rider, self.turn])
-                        self.course.spaces[rider.location[0]].lanes[rider.location[1]] = None
-                    continue
-            
-            #Check if game over
-            game_ended = self.course._checkEndGame()
-            if game_ended:
-                input(_colorWrapper(f'The race is over on turn {self.turn}! Press Enter to see results... ', 'lightsalmon'))
-                # Build string representation of final positions
-                final_positions_as_str = []
-                for rider, turn in self.course.final_positions:
-                    final_positions_as_str.append(_colorWrapper(rider.type, rider.color) + ': turn ' + str(turn))
-                # Build string representation of riders that didn't finish
-                not_finished_as_str = []
-                for rider in self.course.riders:
-                    if rider not in [r[0] for r in self.course.final_positions]:
-                        not_finished_as_str.append(_colorWrapper(rider.type, rider.color))
-                final_string = ' | '.join(final_positions_as_str) + '\n' + 'Riders that did not finish: ' + ', '.join(not_finished_as_str)
-                input(final_string)
-                return self.course.final_positions
-
-            # If game not over, apply exhaustion
-            # And build string representation of riders that had exhaustion applied
-            exhausted_as_str = []
+            if not event['ended']:
+                # String representation of riders that had exhaustion applied
+                exhausted_as_str = [_colorWrapper(rider['type'], rider['color']) for rider in event['exhausted']]
+                print('These riders are getting tired: ' + ', '.join(exhausted_as_str) + '. Press Enter to start next turn...', end='')
+                input('')
+        elif kind == 'over':
+            input(_colorWrapper(f'The race is over on turn {self.game.race.turn}! Press Enter to see results... ', 'lightsalmon'))
+            # Build string representation of final positions
+            final_positions_as_str = [_colorWrapper(rider['type'], rider['color']) + ': turn ' + str(rider['turn']) for rider in event['final_positions']]
+            # Build string representation of riders that didn't finish
+            not_finished_as_str = []
             for rider in self.course.riders:
-                is_exhausted = self.course._applyExhaustion(rider)
-                if is_exhausted:
-                    exhausted_as_str.append(_colorWrapper(rider.type, rider.color))
-                
-                # Draw cards again
-                rider.drawCards()
-            print('These riders are getting tired: ' + ', '.join(exhausted_as_str) + '. Press Enter to start next turn...', end='')
-            input('')
+                if rider not in self.course._finished:
+                    not_finished_as_str.append(_colorWrapper(rider.type, rider.color))
+            final_string = ' | '.join(final_positions_as_str) + '\n' + 'Riders that did not finish: ' + ', '.join(not_finished_as_str)
+            input(final_string)
 
-            self.turn += 1
-
-            
-    def selectRider(self, player: 'Player', riders_and_cards: dict) -> Union['Rider', None]:
+    def prompt(self, decision: dict):
         '''
-        If both riders can still be selected, get input from player.
-        Otherwise return the only selectable rider or None if both have already finished/been selected.
+        Ask a human player for a decision (see game.Game.pending) and return the answer
         '''
-        # Initialize flags that determine whether each rider can be selected
-        selectable = {player.sprinteur: True, player.rouleur: True}
-        # Check if rider has already finished or has already been selected in a previous round
-        for rider in selectable.keys():
-            if self.course._checkFinish(rider) or riders_and_cards[rider]:
-                selectable[rider] = False
-        
-        # Only prompt player for input if both riders are selectable
-        if sum(selectable.values()) == 2:
-            rider_selected = getInput(f'Player {player.color}, select a rider: [s]printeur or [r]ouleur? ', 'sr', 'q', color=player.color)
-            if rider_selected == 's':
-                return player.sprinteur
-            else:
-                return player.rouleur
-        # Return whichever rider has not been selected yet
-        elif sum(selectable.values()) == 1:
-            return list(selectable.keys())[list(selectable.values()).index(True)]
-        # No riders can be selected
-        else:
-            return None
+        color = decision['color']
+        player = self.course.players[self.game.colors.index(color)]
+        print(self.drawCourse())
+        if decision['type'] == 'place':
+            valid_start_pos = [str(pos) for pos in decision['options']]
+            print('Valid positions: ', ' | '.join(valid_start_pos))
+            if self.placement_hints:
+                print('Win rate of each position:\n' + report(bestPlacements(self.course.name, self.game.colors, (color, decision['rider']), self._placed)))
+            return int(getInput(f"Player {color}, place your {decision['rider']}: ", valid_start_pos, 'q', color=color))
+        if decision['type'] == 'rider':
+            # Both riders can play
+            answer = self._advised([player.sprinteur, player.rouleur], f'Player {color}, select a rider: [s]printeur or [r]ouleur? ', 'sr', color)
+            return 'sprinteur' if answer == 's' else 'rouleur'
 
-    def selectCard(self, rider: 'Rider') -> int:
+        rider = player.sprinteur if decision['rider'] == 'sprinteur' else player.rouleur
+        # Display the cards revealed during the first round before playing a card in the second one
+        if self._cards_played_last_round:
+            print('Cards played so far: ', ' | '.join(self._cards_played_last_round), sep='')
         # Generate printable list of cards in hand to play (convert -1 to E for exhaustion cards)
-        hand = [str(i+1) + ': ' + _colorWrapper('E', rider.color) if card==-1 else str(i+1) + ': ' + _colorWrapper(str(card), rider.color) for i, card in enumerate(rider.hand)]
+        hand = [str(i+1) + ': ' + _colorWrapper('E' if card == -1 else str(card), color) for i, card in enumerate(rider.hand)]
         print('\n'.join(hand))
-        # Get list of valid indexes
         valid_indexes = [str(i+1) for i in range(len(hand))]
-        card_selected = getInput(f'Hey, {rider.color} {rider.type}, select one of the cards above to play: ', valid_indexes, 'q', color=rider.color)
-        return int(card_selected)-1
+        # Nothing to advise when every card has the same value
+        riders = [rider] if len(set(rider.hand)) > 1 else []
+        return int(self._advised(riders, f"Hey, {color} {rider.type}, select one of the cards above to play: ", valid_indexes, color)) - 1
+
+    def _advised(self, riders: list, text: str, valids: Union[list, str], color: str) -> str:
+        '''
+        getInput, while the advisor (if enabled) evaluates the options of the given riders
+        '''
+        advise = self.advisor and riders
+        if advise:
+            self.advisor.start(self.course, riders, self.game.race.revealed)
+        try:
+            return getInput(text, valids, 'q', color=color)
+        finally:
+            if advise:
+                self.advisor.stop()
 
 def _colorWrapper(text: str, fg_color: str = '', bg_color: str = '') -> str:
     '''
@@ -352,10 +251,156 @@ def getInput(text: str, valids: Union[list, str], quit: str, color: str = 'light
             input('Press Enter to quit...')
             exit()
 
+class RemoteApp():
+    '''
+    Console client of a game hosted by server.GameServer (TCP address as host:port, or the path of a Unix socket).
+    Plays one seat (or just watches the race if color is None): shows the board after every event and prompts for
+    the decisions of its player.
+    '''
+    def __init__(self, address: str, game_id: int, color: str = None) -> None:
+        if ':' in address:
+            host, port = address.rsplit(':', 1)
+            self.socket = socket.create_connection((host, int(port)))
+        else:
+            self.socket = socket.socket(socket.AF_UNIX)
+            self.socket.connect(address)
+        self.stream = self.socket.makefile('rw')
+        self.game_id = game_id
+        self.color = color
+        self.state = None
+        self.over = False
+        self._events = [] # Events received while waiting for a reply
+
+    def __repr__(self) -> str:
+        return f"<RemoteApp game {self.game_id} - {self.color}>"
+
+    def request(self, **request) -> dict:
+        '''
+        Send a request and return its reply (events received meanwhile are queued)
+        '''
+        self.stream.write(json.dumps(request) + '\n')
+        self.stream.flush()
+        while True:
+            message = json.loads(self.stream.readline())
+            if 'event' not in message:
+                if 'error' in message:
+                    raise RuntimeError(message['error'])
+                return message
+            self._events.append(message)
+
+    @classmethod
+    def create(cls, address: str, course_name: str, player_count: int, bots: dict, color: str = None, seed: int = None) -> 'RemoteApp':
+        '''
+        Create a game on the server and join it
+        '''
+        app = cls(address, None, color)
+        app.game_id = app.request(cmd='create', course=course_name, players=player_count, bots=bots, seed=seed)['game']
+        return app
+
+    def drawCourse(self) -> str:
+        '''
+        Rebuild the board from the rider locations of the last known state and draw it
+        '''
+        course = Course(self.state['course'], _countRange(len(self.state['players'])))
+        for color in self.state['players']:
+            course.addPlayer(color)
+        riders = {(rider.color, rider.type): rider for rider in course.riders}
+        finished = {(rider['color'], rider['type']) for rider in self.state['final_positions']}
+        # Placing riders space by space, lane by lane, gives every rider its original lane
+        for rider in sorted(self.state['riders'], key=lambda x: x['location']):
+            if rider['location'][0] != -1 and (rider['color'], rider['type']) not in finished:
+                course._placeRider(riders[rider['color'], rider['type']], rider['location'][0])
+        return CourseRenderer(course).render()
+
+    def run(self) -> None:
+        reply = self.request(cmd='join', game=self.game_id, color=self.color)
+        self.state = reply['state']
+        print(f"Joined game {self.game_id} on {self.state['course']}" + (f' as {self.color}' if self.color else ''))
+        print(self.drawCourse())
+        if self.state['pending']:
+            self._events.append({'event': 'prompt', **self.state['pending']})
+        while not self.over:
+            if self._events:
+                self.handle(self._events.pop(0))
+                continue
+            line = self.stream.readline()
+            if not line:
+                break
+            self.handle(json.loads(line))
+
+    def handle(self, message: dict) -> None:
+        '''
+        Update the local state with an event and answer prompts for this player
+        '''
+        event = message['event']
+        if event == 'placed':
+            for rider in self.state['riders']:
+                if (rider['color'], rider['type']) == (message['color'], message['type']):
+                    rider['location'] = message['location']
+        elif event == 'turn':
+            self.state['turn'] = message['turn']
+            print(_colorWrapper(f"Starting turn {message['turn']}...", 'lightsalmon'))
+        elif event == 'revealed':
+            print('Cards played so far: ', ' | '.join(_colorWrapper(card['type'], card['color']) + ': ' + str(card['value']) for card in message['cards']), sep='')
+        elif event == 'resolved':
+            self.state['riders'] = message['riders']
+            self.state['final_positions'] = message['final_positions']
+            print('Moved this turn: ', ' | '.join(_colorWrapper(card['type'], card['color']) + ': ' + str(card['value']) for card in message['cards']))
+            print(self.drawCourse())
+        elif event == 'over':
+            self.over = True
+            self.state['pending'] = None
+            self.state['final_positions'] = message['final_positions']
+            print(_colorWrapper(f"The race is over on turn {self.state['turn']}!", 'lightsalmon'))
+            print(' | '.join(_colorWrapper(rider['type'], rider['color']) + ': turn ' + str(rider['turn']) for rider in message['final_positions']))
+        elif event == 'prompt':
+            self.state['pending'] = {key: value for key, value in message.items() if key not in ('event', 'game')}
+            if message['color'] == self.color:
+                self.request(cmd='play', game=self.game_id, color=self.color, answer=self.prompt(message))
+
+    def prompt(self, decision: dict):
+        '''
+        Ask the player for a decision and return the answer
+        '''
+        color = decision['color']
+        if decision['type'] == 'place':
+            print(self.drawCourse())
+            valid = [str(pos) for pos in decision['options']]
+            print('Valid positions: ', ' | '.join(valid))
+            return int(getInput(f"Player {color}, place your {decision['rider']}: ", valid, 'q', color=color))
+        if decision['type'] == 'rider':
+            answer = getInput(f'Player {color}, select a rider: [s]printeur or [r]ouleur? ', 'sr', 'q', color=color)
+            return 'sprinteur' if answer == 's' else 'rouleur'
+        # Hands are private: the server only sends them to the client that joined as their color
+        cards = self.request(cmd='state', game=self.game_id, color=color)['state']['hands'][decision['rider']]
+        hand = [str(i+1) + ': ' + _colorWrapper('E' if card == -1 else str(card), color) for i, card in enumerate(cards)]
+        print('\n'.join(hand))
+        valid_indexes = [str(i+1) for i in range(len(hand))]
+        return int(getInput(f"Hey, {color} {decision['rider']}, select one of the cards above to play: ", valid_indexes, 'q', color=color)) - 1
+
 def main():
-    app = App()
-    app.gameLoop()
-    input('')
+    parser = argparse.ArgumentParser(description='Play Flamme Rouge on the console.')
+    parser.add_argument('--connect', metavar='ADDRESS', help='play on a game server (host:port or Unix socket path) instead of locally')
+    parser.add_argument('--game', type=int, help='id of the game to join (a new game is created otherwise)')
+    parser.add_argument('--color', help='seat to play (omit to watch)')
+    parser.add_argument('--course', default='La Classicissima', help='course of a new game')
+    parser.add_argument('--players', type=int, default=2, help='number of players of a new game')
+    parser.add_argument('--bots', nargs='*', default=[], metavar='COLOR=POLICY', help='computer players of a new game')
+    parser.add_argument('--hints', action='store_true', help='show the simulated win rate of every start position (local games)')
+    parser.add_argument('--advice', action='store_true', help='evaluate the options of human players while they choose (local games)')
+    args = parser.parse_args()
+
+    if not args.connect:
+        app = App(placement_hints=args.hints, advice=args.advice)
+        app.gameLoop()
+        input('')
+        return
+    if args.game is None:
+        bots = dict(bot.split('=') for bot in args.bots)
+        app = RemoteApp.create(args.connect, args.course, args.players, bots, args.color)
+    else:
+        app = RemoteApp(args.connect, args.game, args.color)
+    app.run()
 
 if __name__ == '__main__':
     main()
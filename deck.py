@@ -0,0 +1,139 @@
+# Count-based deck model
+import random
+from math import comb
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING: # main imports this module
+    from main import Rider
+
+# Every card value a deck can hold. Exhaustion cards are represented by -1 (and move 2 spaces)
+CARD_VALUES = (-1, 2, 3, 4, 5, 6, 7, 9)
+# Position of each value in the count lists
+CARD_SLOT = {value: i for i, value in enumerate(CARD_VALUES)}
+
+class DeckComposition():
+    '''
+    Rider deck stored as the number of cards of each value (see CARD_VALUES) in the draw and discard decks.
+    The order of the draw deck is treated as unknown, so it can be cloned, hashed (see key) and queried
+    for probabilities without materialising a shuffled list.
+    '''
+    def __init__(self, draw: list = None, discard: list = None) -> None:
+        self.draw = list(draw) if draw else [0] * len(CARD_VALUES)
+        self.discard = list(discard) if discard else [0] * len(CARD_VALUES)
+
+    def __repr__(self) -> str:
+        return f"<DeckComposition draw {self.counts(self.draw)} - discard {self.counts(self.discard)}>"
+
+    @classmethod
+    def fromCards(cls, draw_deck: list, discard_deck: list = ()) -> 'DeckComposition':
+        composition = cls()
+        for card in draw_deck:
+            composition.draw[CARD_SLOT[card]] += 1
+        for card in discard_deck:
+            composition.discard[CARD_SLOT[card]] += 1
+        return composition
+
+    @classmethod
+    def fromRider(cls, rider: 'Rider') -> 'DeckComposition':
+        return cls.fromCards(rider.draw_deck, rider.discard_deck)
+
+    @staticmethod
+    def counts(pile: list) -> dict:
+        '''
+        Readable {card value: count} of a count list (values with no cards are left out)
+        '''
+        return {value: count for value, count in zip(CARD_VALUES, pile) if count}
+
+    def copy(self) -> 'DeckComposition':
+        new_composition = DeckComposition.__new__(DeckComposition)
+        new_composition.draw = self.draw[:]
+        new_composition.discard = self.discard[:]
+        return new_composition
+
+    def key(self) -> tuple:
+        '''
+        Hashable representation of the composition
+        '''
+        return tuple(self.draw) + tuple(self.discard)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, DeckComposition) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+    def drawSize(self) -> int:
+        return sum(self.draw)
+
+    def discardSize(self) -> int:
+        return sum(self.discard)
+
+    def reshuffle(self) -> None:
+        '''
+        Move the discard deck into the draw deck
+        '''
+        self.draw = [a+b for a, b in zip(self.draw, self.discard)]
+        self.discard = [0] * len(CARD_VALUES)
+
+    def discardCards(self, cards: list) -> None:
+        for card in cards:
+            self.discard[CARD_SLOT[card]] += 1
+
+    def addExhaustion(self) -> None:
+        self.discard[CARD_SLOT[-1]] += 1
+
+    def drawCard(self, rng: 'random.Random') -> int:
+        '''
+        Draw a random card according to the counts (reshuffle the discard deck first if the draw deck is empty)
+        Returns None if both decks are empty
+        '''
+        total = self.drawSize()
+        if not total:
+            self.reshuffle()
+            total = self.drawSize()
+            if not total:
+                return None
+        pick = rng.randrange(total)
+        for slot, count in enumerate(self.draw):
+            if pick < count:
+                self.draw[slot] -= 1
+                return CARD_VALUES[slot]
+            pick -= count
+
+    def drawHand(self, rng: 'random.Random', size: int = 4) -> list:
+        '''
+        Draw a hand the same way Rider.drawCards does
+        '''
+        hand = []
+        for _ in range(size):
+            card = self.drawCard(rng)
+            if card is None:
+                break
+            hand.append(card)
+        return hand or [-1]
+
+    def drawProbability(self, value: int) -> float:
+        '''
+        Probability that the next card drawn has the given value
+        '''
+        pile = self.draw if self.drawSize() else self.discard
+        total = sum(pile)
+        return pile[CARD_SLOT[value]] / total if total else 0.0
+
+    def handProbability(self, value: int, size: int = 4) -> float:
+        '''
+        Probability that the next hand of the given size holds at least one card of the given value.
+        If the draw deck has fewer cards, all of them are drawn and the rest comes from the reshuffled discard deck.
+        '''
+        slot = CARD_SLOT[value]
+        in_draw = self.drawSize()
+        if in_draw >= size:
+            return 1 - comb(in_draw - self.draw[slot], size) / comb(in_draw, size)
+        if self.draw[slot]:
+            return 1.0
+        # Whole draw deck is drawn without the value. The rest of the hand comes from the discard deck
+        in_discard = self.discardSize()
+        remaining = min(size - in_draw, in_discard)
+        if not remaining:
+            return 0.0
+        return 1 - comb(in_discard - self.discard[slot], remaining) / comb(in_discard, remaining)
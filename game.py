@@ -0,0 +1,126 @@
+# Non-blocking game flow
+from main import Course, Race, Rider, PLAYER_COLORS, _countRange
+
+class Game():
+    '''
+    One race driven by answers instead of blocking prompts.
+    The flow of the race (see Race.placementFlow and Race.cardFlow) stops at every decision of a human player
+    (any color without a bot). pending describes that decision:
+        {'type': 'place' | 'rider' | 'card', 'color': player color, 'rider': rider type (or None), 'options': valid answers}
+    and submit() resumes the flow with the answer. Computer players (bots: color -> Policy) are played inline.
+    Players are seated in the order of colors (default: the first player_count PLAYER_COLORS).
+    Everything that happens is queued as JSON serializable events, returned by submit() (and by start()).
+    pending is None once the race is over.
+    '''
+    def __init__(self, course_name: str, player_count: int, bots: dict = None, seed: int = None, colors: list = None) -> None:
+        self.course = Course(course_name, _countRange(player_count), seed=seed)
+        self.colors = list(colors or PLAYER_COLORS[:player_count])
+        for color in self.colors:
+            self.course.addPlayer(color)
+        self.bots = bots or {}
+        self.race = Race(self.course, self.bots)
+        self.race.listener = self._onRace
+        self.pending = None
+        self.events = []
+        self._flow = None
+
+    def __repr__(self) -> str:
+        return f"<Game '{self.course.name}' - turn {self.race.turn}>"
+
+    @property
+    def over(self) -> bool:
+        return self._flow is not None and self.pending is None
+
+    def start(self) -> list:
+        '''
+        Run the flow until the first human decision. Returns the events so far
+        '''
+        self._flow = self._play()
+        self._advance(None)
+        return self._flush()
+
+    def submit(self, color: str, answer) -> list:
+        '''
+        Answer the pending decision. Raises ValueError if it is not this player's decision or the answer is not valid.
+        Returns the events that happened until the next human decision
+        '''
+        if self.pending is None:
+            raise ValueError('No decision is pending')
+        if color != self.pending['color']:
+            raise ValueError(f"Waiting for player {self.pending['color']}, not {color}")
+        if answer not in self.pending['options']:
+            raise ValueError(f"Invalid answer {answer!r}. Valid answers: {self.pending['options']}")
+        self._advance(answer)
+        return self._flush()
+
+    def _advance(self, answer) -> None:
+        try:
+            self.pending = self._flow.send(answer)
+        except StopIteration:
+            self.pending = None
+        except Exception:
+            # The flow can't be resumed after an error (e.g. raised by a computer player): the game is over
+            self.pending = None
+            raise
+        if self.pending is not None:
+            self._event('prompt', **self.pending)
+
+    def _flush(self) -> list:
+        events, self.events = self.events, []
+        return events
+
+    def _event(self, event: str, **data) -> None:
+        self.events.append({'event': event, **data})
+
+    def state(self, color: str = None) -> dict:
+        '''
+        Public state of the race (plus the hands of color's riders: only give a player's color for that player)
+        '''
+        state = {
+            'course': self.course.name,
+            'players': self.colors,
+            'turn': self.race.turn,
+            'riders': [_riderState(rider) for rider in self.course.riders],
+            'final_positions': self._finalPositions(),
+            'pending': self.pending,
+        }
+        if color in self.colors:
+            player = self.course.players[self.colors.index(color)]
+            state['hands'] = {rider.type: list(rider.hand) for rider in (player.sprinteur, player.rouleur)}
+        return state
+
+    def _play(self) -> iter:
+        '''
+        The whole race. Yields a decision (see pending) and receives its answer
+        '''
+        race = self.race
+        yield from race.placementFlow()
+        while True:
+            race.startTurn()
+            self._event('turn', turn=race.turn)
+            played_cards = yield from race.cardFlow()
+            if race.resolveCards(played_cards):
+                self._event('over', final_positions=self._finalPositions())
+                return
+
+    def _onRace(self, event: str, **data) -> None:
+        '''
+        Queue the steps of the race (see Race.listener) as events
+        '''
+        if event in ('placed', 'played'):
+            self._event(event, **_riderState(data['rider']))
+        elif event == 'revealed':
+            self._event('revealed', cards=[dict(_riderState(rider), value=value) for rider, value in data['cards'].items()])
+        elif event == 'resolved':
+            result = data['result']
+            self._event('resolved', cards=[dict(_riderState(rider), value=value) for rider, value, _ in result.moves],
+                        slipped=[_riderState(rider) for rider in result.slipped],
+                        exhausted=[_riderState(rider) for rider in result.exhausted],
+                        riders=[_riderState(rider) for rider in self.course.riders],
+                        final_positions=self._finalPositions(), ended=result.ended)
+
+    def _finalPositions(self) -> list:
+        return [dict(_riderState(rider), turn=turn) for rider, turn in self.course.final_positions]
+
+def _riderState(rider: 'Rider') -> dict:
+    return {'color': rider.color, 'type': rider.type, 'location': list(rider.location)}
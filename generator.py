@@ -0,0 +1,176 @@
+# Random course generator, balanced by simulation
+import argparse
+import functools
+import json
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from main import POLICIES, getLayout, getTiles, simulateRace
+
+# Scores of a course: mean race length in turns, share of races won by a sprinteur, number of races played
+CourseScore = namedtuple('CourseScore', ['turns', 'sprinteur_wins', 'races'])
+
+def physicalTiles() -> dict:
+    '''
+    Tile inventory: physical tile -> ids of its sides ('a' and 'A' are the two sides of one tile, as are '1a' and '1b')
+    '''
+    tiles = {}
+    for tile_id in getTiles():
+        tiles.setdefault(tile_id[:-1] if tile_id[0].isdigit() else tile_id.lower(), []).append(tile_id)
+    return tiles
+
+def _sides(space_type: str) -> list:
+    '''
+    Sides of every physical tile that have spaces of a given type (e.g. start or finish), by physical tile
+    '''
+    tiles = getTiles()
+    sides = {}
+    for tile, tile_ids in physicalTiles().items():
+        matching = [tile_id for tile_id in tile_ids if any(space[0] == space_type for space in tiles[tile_id])]
+        if matching:
+            sides[tile] = matching
+    return sides
+
+def startRoom(tile_ids: tuple) -> int:
+    '''
+    Number of riders that fit on the start and breakaway spaces (a breakaway space keeps one lane free)
+    '''
+    return getLayout(tuple(tile_ids)).startRoom()
+
+def lanesFit(tile_id: str, next_tile_id: str) -> bool:
+    '''
+    True if a tile can follow another one: the road gets at most one lane wider or narrower at the junction
+    (as on every course of courses.json)
+    '''
+    tiles = getTiles()
+    return abs(tiles[tile_id][-1][1] - tiles[next_tile_id][0][1]) <= 1
+
+def randomCourse(rng: random.Random, player_count: int = 4, length: int = 21, expansion: bool = True) -> tuple:
+    '''
+    Tile ids of a random valid course: a start tile first, then the breakaway tile (with expansion, as on the expansion's
+    stages), a finish tile last, no physical tile used twice, lane widths that fit at every junction (see lanesFit)
+    and room on the start for every rider. Without expansion, only the tiles of the base game (letters) are used
+    '''
+    inventory = {tile: sides for tile, sides in physicalTiles().items() if expansion or not tile[0].isdigit()}
+    starts = {tile: sides for tile, sides in _sides('start').items() if tile in inventory}
+    finishes = {tile: sides for tile, sides in _sides('finish').items() if tile in inventory}
+    breakaways = {tile: sides for tile, sides in _sides('breakaway').items() if tile in inventory}
+    special = set(_sides('start')) | set(_sides('finish')) | set(_sides('breakaway'))
+    middle = sorted(tile for tile in inventory if tile not in special)
+    fixed = 2 + bool(breakaways)
+    if length - fixed > len(middle):
+        raise ValueError(f'Not enough tiles for a course of {length} tiles (at most {len(middle)+fixed})')
+    # Start and breakaway tiles hold every start and breakaway space
+    grids = [(start,) + breakaway for tile in starts for start in starts[tile]
+             for breakaway in ([(side,) for sides in breakaways.values() for side in sides] or [()])]
+    if max(startRoom(grid) for grid in grids) < player_count*2:
+        raise ValueError(f'No start grid has room for {player_count} players')
+    while True:
+        tile_ids = [rng.choice(starts[rng.choice(sorted(starts))])]
+        if breakaways:
+            tile_ids.append(rng.choice(breakaways[rng.choice(sorted(breakaways))]))
+        # Middle tiles one at a time, among the sides that fit the end of the course so far
+        remaining = set(middle)
+        while len(tile_ids) < length-1:
+            options = [(tile, side) for tile in sorted(remaining) for side in inventory[tile] if lanesFit(tile_ids[-1], side)]
+            if not options:
+                break
+            tile, side = rng.choice(options)
+            remaining.discard(tile)
+            tile_ids.append(side)
+        finish_options = [side for tile in sorted(finishes) for side in finishes[tile] if lanesFit(tile_ids[-1], side)]
+        if len(tile_ids) < length-1 or not finish_options:
+            continue
+        tile_ids.append(rng.choice(finish_options))
+        if all(lanesFit(tile_id, next_tile_id) for tile_id, next_tile_id in zip(tile_ids, tile_ids[1:])) and startRoom(tile_ids) >= player_count*2:
+            return tuple(tile_ids)
+
+@functools.lru_cache(maxsize=None)
+def scoreLayout(tile_ids: tuple, player_count: int, races: int, seed: int, policy_names: tuple) -> 'CourseScore':
+    '''
+    Play seeded headless races (seeds seed, ..., seed+races-1) on a sequence of tiles. Memoized
+    '''
+    turns = sprinteur_wins = 0
+    for race_seed in range(seed, seed+races):
+        _, race_turns, arrivals, _ = simulateRace('Generated', player_count, policy_names, race_seed, tiles=tile_ids)
+        turns += race_turns
+        sprinteur_wins += arrivals[0][1] == 'sprinteur'
+    return CourseScore(turns / races, sprinteur_wins / races, races)
+
+def _scoreChunk(args: tuple) -> list:
+    '''
+    Worker entry point: score a list of courses
+    '''
+    candidates, player_count, races, seed, policy_names = args
+    return [(tile_ids, scoreLayout(tile_ids, player_count, races, seed, policy_names)) for tile_ids in candidates]
+
+def error(score: 'CourseScore', target_turns: float, balance_weight: float = 1.0) -> float:
+    '''
+    Distance of a course from the targets: relative error of the race length plus the imbalance between
+    sprinteur and rouleur wins (0 when each wins half of the races)
+    '''
+    return abs(score.turns - target_turns) / target_turns + balance_weight * abs(score.sprinteur_wins - 0.5)
+
+def searchCourses(candidates: int, target_turns: float, player_count: int = 4, races: int = 20, length: int = 21, expansion: bool = True,
+                  policy_names: list = None, seed: int = 0, workers: int = None, chunk_size: int = 25, balance_weight: float = 1.0) -> list:
+    '''
+    Generate random courses and score each of them with the same race seeds, in a process pool.
+    Candidates drawn more than once are only played once.
+    Returns [(error, tile ids, CourseScore)], best first. Results do not depend on the number of workers
+    '''
+    policy_names = tuple(policy_names or ['greedy'] * player_count)
+    if len(policy_names) != player_count:
+        raise ValueError(f'Expected {player_count} policies, got {len(policy_names)}')
+    rng = random.Random(seed)
+    courses = list(dict.fromkeys(randomCourse(rng, player_count, length, expansion) for _ in range(candidates)))
+    chunks = [(courses[i:i+chunk_size], player_count, races, seed, policy_names) for i in range(0, len(courses), chunk_size)]
+    scores = []
+    if workers == 1:
+        for chunk in chunks:
+            scores.extend(_scoreChunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk_scores in executor.map(_scoreChunk, chunks):
+                scores.extend(chunk_scores)
+    return sorted((error(score, target_turns, balance_weight), tile_ids, score) for tile_ids, score in scores)
+
+def main():
+    '''
+    Search random courses and print (or save, in the format of courses.json) the best ones
+    '''
+    parser = argparse.ArgumentParser(description='Generate Flamme Rouge courses and balance them by simulation.')
+    parser.add_argument('--candidates', type=int, default=1000)
+    parser.add_argument('--turns', type=float, default=15, help='target race length in turns')
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--races', type=int, default=20, help='races played on every candidate')
+    parser.add_argument('--length', type=int, default=21, help='number of tiles (start and finish included)')
+    parser.add_argument('--base', action='store_true', help='only use the tiles of the base game')
+    parser.add_argument('--balance', type=float, default=1.0, help='weight of the sprinteur/rouleur balance against the race length')
+    parser.add_argument('--policies', nargs='+', default=None, choices=list(POLICIES), help='one policy per seat (a single name is used for every seat)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: one per CPU, 1 = no pool)')
+    parser.add_argument('--top', type=int, default=5, help='number of courses to keep')
+    parser.add_argument('--save', metavar='PATH', help='write the best courses as a courses.json file')
+    args = parser.parse_args()
+
+    policy_names = args.policies
+    if policy_names and len(policy_names) == 1:
+        policy_names = policy_names * args.players
+    start = time.perf_counter()
+    results = searchCourses(args.candidates, args.turns, args.players, args.races, args.length, not args.base,
+                            policy_names, args.seed, args.workers, balance_weight=args.balance)
+    print(f'{len(results)} courses scored in {time.perf_counter()-start:.1f} s')
+    count_range = '2-4' if args.players <= 4 else '5-6'
+    courses = {}
+    for rank, (distance, tile_ids, score) in enumerate(results[:args.top], 1):
+        print(f"{rank}. {' '.join(tile_ids)}: {score.turns:.1f} turns, sprinteur wins {score.sprinteur_wins:.0%} (error {distance:.3f})")
+        courses[f'Generated {rank}'] = {count_range: list(tile_ids)}
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(courses, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
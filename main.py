@@ -1,5 +1,79 @@
+import os
 import random
 import json
+import time
+import argparse
+import functools
+from typing import Union, Callable
+from deck import DeckComposition, CARD_VALUES, CARD_SLOT
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# Data files are looked up next to this module so the game can be started from any directory
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+@functools.lru_cache(maxsize=None)
+def loadData(filename: str) -> dict:
+    '''
+    Parse a json file from the data directory.
+    Each file is only parsed once per process. The returned dict is shared, so don't modify it.
+    '''
+    with open(os.path.join(DATA_DIR, filename)) as file:
+        return json.load(file)
+
+def getTiles() -> dict:
+    '''
+    Tile id -> list of [space type, number of lanes]
+    '''
+    return loadData('tiles.json')
+
+def getCourses() -> dict:
+    '''
+    Course name -> player count range -> list of tile ids
+    '''
+    return loadData('courses.json')
+
+class SpaceType():
+    '''
+    Rules of a type of space. Immutable flyweight shared by every space of that type (use SPACE_TYPES)
+    '''
+    __slots__ = ('type', 'max_pw', 'min_pw', 'slip', 'start', 'finish', 'breakaway')
+
+    def __init__(self, typ: str, max_pw: int = 9, min_pw: int = 2, slip: bool = True) -> None:
+        for attribute, value in zip(self.__slots__, (typ, max_pw, min_pw, slip, typ == 'start', typ == 'finish', typ == 'breakaway')):
+            object.__setattr__(self, attribute, value)
+
+    def __setattr__(self, attribute: str, value) -> None:
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self) -> str:
+        return f"<SpaceType '{self.type}'>"
+
+    def __reduce__(self) -> tuple:
+        # Copies and unpickled types are the shared instance of the process
+        return _spaceType, (self.type,)
+
+# Space type name -> shared SpaceType
+SPACE_TYPES = {
+    'normal': SpaceType('normal'),
+    'uphill': SpaceType('uphill', max_pw=5, slip=False),
+    'downhill': SpaceType('downhill', min_pw=5),
+    'cobble': SpaceType('cobble', slip=False),
+    'supply': SpaceType('supply', min_pw=4),
+    'start': SpaceType('start'),
+    'finish': SpaceType('finish'),
+    'breakaway': SpaceType('breakaway'),
+}
+
+def _spaceType(typ: str) -> 'SpaceType':
+    '''
+    Shared SpaceType of a type name (unknown types behave like normal spaces)
+    '''
+    try:
+        return SPACE_TYPES[typ]
+    except KeyError:
+        return SPACE_TYPES.setdefault(typ, SpaceType(typ))
 
 class Space():
     '''
@@ -10,85 +84,352 @@ class Space():
         cobble = no slip
         supply = min 4
         start/finish/breakaway (special tiles)
+    The rules of the type (max_pw, min_pw, slip, start, finish, breakaway) are read from a shared SpaceType
     '''
+    __slots__ = ('tile', 'lanes', 'kind')
+
     def __init__(self, tile: 'Tile', typ: str, size: int) -> None: 
         self.tile = tile # Parent tile
         self.lanes = [None for _ in range(size)]
-        self.type = typ
-        self.max_pw = 9
-        self.min_pw = 2
-        self.slip = True
-        self.start = False
-        self.finish = False
-        self.breakaway = False
-        self._setAttributes()
+        self.kind = _spaceType(typ)
         # need to store relative coords as well
 
     def __repr__(self) -> str:
         return f"<Space '{self.type}' - tile '{self.tile}'>"
-    
-    def _setAttributes(self) -> None:
-        '''
-        Change default attributes if special space
-        '''
-        if self.type == 'uphill':
-            self.max_pw = 5
-            self.slip = False
-        elif self.type == 'downhill':
-            self.min_pw = 5
-        elif self.type == 'cobble':
-            self.slip = False
-        elif self.type == 'supply':
-            self.min_pw = 4
-        elif self.type == 'start':
-            self.start = True
-        elif self.type == 'finish':
-            self.finish = True
-        elif self.type == 'breakaway':
-            self.breakaway = True
+
+    type = property(lambda self: self.kind.type)
+    max_pw = property(lambda self: self.kind.max_pw)
+    min_pw = property(lambda self: self.kind.min_pw)
+    slip = property(lambda self: self.kind.slip)
+    start = property(lambda self: self.kind.start)
+    finish = property(lambda self: self.kind.finish)
+    breakaway = property(lambda self: self.kind.breakaway)
+
+    def copy(self, tile: 'Tile') -> 'Space':
+        '''
+        Return an empty copy of this space belonging to another tile
+        '''
+        new_space = Space.__new__(Space)
+        new_space.tile = tile
+        new_space.lanes = [None] * len(self.lanes)
+        new_space.kind = self.kind
+        return new_space
 
 class Tile():
+    __slots__ = ('id', 'spaces')
+
     def __init__(self, id: str) -> None:
         self.id=id
-        with open(r'data\tiles.json') as file:
-            tiles = json.load(file)
-        
         self.spaces = []
-        for space in tiles[id]:
+        for space in getTiles()[id]:
             self.spaces.append(Space(self, space[0], space[1]))
 
     def __repr__(self) -> str:
         return f"<Tile {self.id}>"
 
+    def copy(self) -> 'Tile':
+        '''
+        Return a copy of this tile with empty spaces
+        '''
+        new_tile = Tile.__new__(Tile)
+        new_tile.id = self.id
+        new_tile.spaces = [space.copy(new_tile) for space in self.spaces]
+        return new_tile
+
+@functools.lru_cache(maxsize=None)
+def _tilesTemplate(tile_ids: tuple) -> tuple:
+    '''
+    Tiles of any sequence of tile ids, built once per process and copied by every new Course
+    '''
+    return tuple(Tile(tile_id) for tile_id in tile_ids)
+
+# Highest movement value of any card
+MAX_CARD = 9
+
+class CourseLayout():
+    '''
+    Static data of a course, as flat tuples indexed by space. Immutable, and shared by every Course built from the same tiles
+    (use getLayout to get it).
+        types, lanes, min_pw, max_pw, slip, is_finish: attributes of every space
+        start, breakaway, finish: indexes of the start, breakaway and finish spaces
+        targets[space][value]: nominal target of a move of a given value from a space (speed limits applied, except to
+        slipstream moves of 1, and capped at the last space). Lanes being full is not taken into account.
+    '''
+    __slots__ = ('tile_ids', 'size', 'types', 'lanes', 'min_pw', 'max_pw', 'slip', 'is_finish', 'start', 'breakaway', 'finish', 'targets')
+
+    def __init__(self, tile_ids: tuple) -> None:
+        spaces = [space for tile in _tilesTemplate(tile_ids) for space in tile.spaces]
+        size = len(spaces)
+        attributes = {
+            'tile_ids': tile_ids,
+            'size': size,
+            'types': tuple(space.type for space in spaces),
+            'lanes': tuple(len(space.lanes) for space in spaces),
+            'min_pw': tuple(space.min_pw for space in spaces),
+            'max_pw': tuple(space.max_pw for space in spaces),
+            'slip': tuple(space.slip for space in spaces),
+            'is_finish': tuple(space.finish for space in spaces),
+            'start': tuple(i for i, space in enumerate(spaces) if space.start),
+            'breakaway': tuple(i for i, space in enumerate(spaces) if space.breakaway),
+            'finish': tuple(i for i, space in enumerate(spaces) if space.finish),
+            'targets': tuple(
+                tuple(min(i + (value if value == 1 else max(space.min_pw, min(space.max_pw, value))), size-1) for value in range(MAX_CARD+1))
+                for i, space in enumerate(spaces)),
+        }
+        for attribute, value in attributes.items():
+            object.__setattr__(self, attribute, value)
+
+    def __setattr__(self, attribute: str, value) -> None:
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self) -> str:
+        return f"<CourseLayout {''.join(self.tile_ids)} - {self.size} spaces>"
+
+    def __reduce__(self) -> tuple:
+        # Copies and unpickled layouts are the shared instance of the process
+        return getLayout, (self.tile_ids,)
+
+    def startRoom(self) -> int:
+        '''
+        Number of riders that fit on the start and breakaway spaces (a breakaway space keeps one lane free)
+        '''
+        return sum(self.lanes[i] for i in self.start) + sum(self.lanes[i]-1 for i in self.breakaway)
+
+    def target(self, space: int, value: int) -> int:
+        '''
+        Nominal target of a move (see targets)
+        '''
+        if value <= MAX_CARD:
+            return self.targets[space][value]
+        return min(space + (value if value == 1 else max(self.min_pw[space], min(self.max_pw[space], value))), self.size-1)
+
+@functools.lru_cache(maxsize=None)
+def getLayout(tile_ids: tuple) -> 'CourseLayout':
+    '''
+    Shared layout of a sequence of tile ids
+    '''
+    return CourseLayout(tuple(tile_ids))
+
+# Zobrist hashing: widest space, most riders, most cards of a value in a pile, seed of the keys (same keys in every process)
+MAX_LANES = 3
+MAX_RIDERS = 12
+MAX_COUNT = 16
+ZOBRIST_SEED = 0x5EED
+
+class ZobristKeys():
+    '''
+    Random 64-bit keys of every component of a race state, for courses of a given size:
+        board[(space*MAX_LANES + lane)*MAX_RIDERS + rider]: rider on a lane of a space
+        finish[rider*MAX_RIDERS + rank]: rider arrived in a given rank
+        deck[((rider*3 + pile)*len(CARD_VALUES) + value)*MAX_COUNT + count]: count of cards of a value in a pile
+        (piles: 0 == draw, 1 == discard, 2 == hand)
+    Riders are numbered as in board.Board (order of course.players, sprinteur then rouleur).
+    '''
+    def __init__(self, size: int) -> None:
+        rng = random.Random(ZOBRIST_SEED)
+        self.board = tuple(rng.getrandbits(64) for _ in range(size*MAX_LANES*MAX_RIDERS))
+        self.finish = tuple(rng.getrandbits(64) for _ in range(MAX_RIDERS*MAX_RIDERS))
+        self.deck = tuple(rng.getrandbits(64) for _ in range(MAX_RIDERS*3*len(CARD_VALUES)*MAX_COUNT))
+
+    def __repr__(self) -> str:
+        return f"<ZobristKeys {len(self.board)//(MAX_LANES*MAX_RIDERS)} spaces>"
+
+@functools.lru_cache(maxsize=None)
+def getZobristKeys(size: int) -> 'ZobristKeys':
+    return ZobristKeys(size)
+
+def _undoable(method):
+    '''
+    Decorator for Course methods that change the game state.
+    While Course is recording, everything changed by one call (including nested undoable calls) is reverted by a single Course.undo()
+    '''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._undo_stack is None or self._undo_depth:
+            return method(self, *args, **kwargs)
+        self._undo_stack.append([])
+        if self._zobrist is not None: # Undoing the group restores the hash as it was before the call
+            self._undo_stack[-1].append((self._setHash, (self.hash,)))
+        self._undo_depth += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._undo_depth -= 1
+    return wrapper
+
 class Course():
     '''
     Main class that stores most of the game state and serves as a connection between Player, Space and Rider classes.
     player_count is a string representation of the minimum and maximum number of players for the course.
+    seed is used to build the course's own random generator (which shuffles every rider deck), so a race can be reproduced.
+    tiles is an optional list of tile ids used instead of the courses.json entry (e.g. for generated courses).
+    After startRecording(), every state change made through Course (moves, slipstream, card plays, draws, exhaustion, finish)
+    can be reverted with undo(), which is much cheaper than deep copying the course to look ahead.
     '''
-    def __init__(self, name: str, player_count: str) -> None:
+    __slots__ = ('name', 'rng', 'max_players', 'layout', 'tiles', 'spaces', 'players', 'riders', '_rider_keys', 'final_positions', '_finished',
+                 '_occupied', '_all_free', '_free', '_undo_stack', '_undo_depth', 'log', 'profiler', '_zobrist', '_hash_decks', '_slots', '_deck_counts', 'hash',
+                 'turn')
+
+    def __init__(self, name: str, player_count: str, seed: int = None, tiles: list = None) -> None:
         self.name = name
+        self.rng = random.Random(seed)
         self.max_players = int(player_count[-1]) # E.g. player_count = '2-4' -> max players = 4
-        # Load tiles
-        with open(r'data/courses.json') as file:
-            courses = tiles = json.load(file)
-        self.tiles = []
-        for tile_id in courses[name][player_count]:
-            self.tiles.append(Tile(tile_id))
+        # Static data shared by every course with the same tiles. Raises KeyError if the course has no version for that player count
+        tile_ids = tuple(tiles) if tiles else tuple(getCourses()[name][player_count])
+        self.layout = getLayout(tile_ids)
+        # Copy tiles from the prebuilt ones
+        self.tiles = [tile.copy() for tile in _tilesTemplate(tile_ids)]
         # Put all spaces from tiles in a single list
         self.spaces = []
         for tile in self.tiles:
             self.spaces.extend(tile.spaces)
 
         # Initialize players and riders lists
+        # Riders are always ordered by position (front to back). _rider_keys holds the matching sort keys
         self.players = []
         self.riders = []
+        self._rider_keys = []
+
+        # Number of turns resolved so far (see resolveTurn)
+        self.turn = 0
 
-        # Initialize final arrival positions
+        # Initialize final arrival positions (and the same riders as a set, for membership tests)
         self.final_positions = []
+        self._finished = set()
+
+        # Peloton index: sorted indexes of the spaces with at least one rider
+        self._occupied = []
+        # Free lanes of each space as a bitmask (bit i set == lane i is empty)
+        self._all_free = [(1 << lanes) - 1 for lanes in self.layout.lanes]
+        self._free = self._all_free[:]
+
+        # Undo records (None == not recording). One list of (function, args) per undoable call
+        self._undo_stack = None
+        self._undo_depth = 0
+
+        # Event log (see racelog.RaceLogger). None == not logging
+        self.log = None
+        # Phase timings and internal counters (see profiler.TurnProfiler). None == not profiling
+        self.profiler = None
+
+        # Zobrist hash of the state (None == not hashing, see enableHash)
+        self._zobrist = None
+        self._deck_counts = None
+        self.hash = 0
 
     def __repr__(self) -> str:
         return f"<Course '{self.name}' - max {self.max_players} players>"
 
+    def startRecording(self) -> None:
+        '''
+        Start recording undo information (any previous records are dropped)
+        '''
+        self._undo_stack = []
+
+    def stopRecording(self) -> None:
+        self._undo_stack = None
+
+    def _record(self, function: 'Callable', *args) -> None:
+        '''
+        Store how to revert a change (if recording)
+        '''
+        if self._undo_stack is not None:
+            self._undo_stack[-1].append((function, args))
+
+    def undo(self) -> None:
+        '''
+        Revert the last undoable call (e.g. moveRider, _applySlip, playCard).
+        The random generator is not rewound, so redoing the same draw gives a different hand.
+        '''
+        if not self._undo_stack:
+            raise RuntimeError('Nothing to undo')
+        for function, args in reversed(self._undo_stack.pop()):
+            function(*args)
+
+    def enableHash(self, decks: bool = False) -> int:
+        '''
+        Start keeping a 64-bit Zobrist hash of the state in self.hash, updated incrementally by every change made through Course.
+        The board (which rider is on which lane) and the arrival order are always part of it.
+        With decks, so is the number of cards of each value in the draw deck, discard deck and hand of every rider
+        (the order of the draw deck is not). Riders have to go through Course (playCard, drawCards...) for decks to stay hashed.
+        Returns the hash
+        '''
+        self._zobrist = getZobristKeys(len(self.spaces))
+        self._hash_decks = decks
+        self._slots = {}
+        for player in self.players:
+            for rider in [player.sprinteur, player.rouleur]:
+                self._slots[rider] = len(self._slots)
+        self.hash = self.computeHash()
+        self._deck_counts = {rider: self._deckCounts(rider) for rider in self._slots} if decks else None
+        return self.hash
+
+    def disableHash(self) -> None:
+        self._zobrist = None
+        self._deck_counts = None
+        self.hash = 0
+
+    def computeHash(self) -> int:
+        '''
+        Hash of the current state computed from scratch (same value as the incremental one)
+        '''
+        keys = self._zobrist
+        value = 0
+        for rider, slot in self._slots.items():
+            if rider not in self._finished and rider.location[0] != -1:
+                value ^= keys.board[(rider.location[0]*MAX_LANES + rider.location[1])*MAX_RIDERS + slot]
+        for rank, (rider, _) in enumerate(self.final_positions):
+            value ^= keys.finish[self._slots[rider]*MAX_RIDERS + rank]
+        if self._hash_decks:
+            for rider, slot in self._slots.items():
+                for pile, counts in enumerate(self._deckCounts(rider)):
+                    for i, count in enumerate(counts):
+                        value ^= keys.deck[((slot*3 + pile)*len(CARD_VALUES) + i)*MAX_COUNT + count]
+        return value
+
+    def _setHash(self, value: int) -> None:
+        self.hash = value
+
+    def _hashRider(self, rider: 'Rider', space: int, lane: int) -> None:
+        '''
+        Toggle a rider on a lane in the hash
+        '''
+        self.hash ^= self._zobrist.board[(space*MAX_LANES + lane)*MAX_RIDERS + self._slots[rider]]
+
+    @staticmethod
+    def _deckCounts(rider: 'Rider') -> tuple:
+        composition = DeckComposition.fromCards(rider.draw_deck, rider.discard_deck)
+        return composition.draw, composition.discard, DeckComposition.fromCards(rider.hand).draw
+
+    def _countCard(self, rider: 'Rider', pile: int, card: int, delta: int) -> None:
+        '''
+        Add delta cards of a value to a pile of a rider (0 == draw, 1 == discard, 2 == hand) in the hashed counts,
+        and rehash that count only
+        '''
+        counts = self._deck_counts[rider][pile]
+        i = CARD_SLOT[card]
+        old_count = counts[i]
+        counts[i] = old_count + delta
+        base = ((self._slots[rider]*3 + pile)*len(CARD_VALUES) + i)*MAX_COUNT
+        self.hash ^= self._zobrist.deck[base + old_count] ^ self._zobrist.deck[base + old_count + delta]
+        self._record(self._setCount, counts, i, old_count)
+
+    @staticmethod
+    def _setCount(counts: list, i: int, count: int) -> None:
+        counts[i] = count
+
+    def _indexSpace(self, index: int) -> None:
+        '''
+        Keep the peloton index in sync after a rider enters or leaves a space
+        '''
+        occupied = self._free[index] != self._all_free[index]
+        i = bisect_left(self._occupied, index)
+        indexed = i < len(self._occupied) and self._occupied[i] == index
+        if occupied and not indexed:
+            self._occupied.insert(i, index)
+        elif indexed and not occupied:
+            del self._occupied[i]
+
     def addPlayer(self, color: str) -> 'Player':
         '''
         Instantiate new player object and add it to course
@@ -99,26 +440,56 @@ class Course():
         # Check if color already exists
         if next((player for player in self.players if player.color == color), None):
             raise ValueError(f'A player with color {color} already exists.')
+        # Check if the riders of every player fit on the start grid
+        if (len(self.players)+1) * 2 > self.layout.startRoom():
+            raise ValueError(f'Not enough room on the start of course {self.name} for {len(self.players)+1} players')
         # Create player, object and add to list
-        new_player = Player(color)
+        new_player = Player(color, self.rng)
         self.players.append(new_player)
-        # Add riders to list
-        self.riders.append(new_player.sprinteur)
-        self.riders.append(new_player.rouleur)
+        # Add riders to ordered index
+        for rider in [new_player.sprinteur, new_player.rouleur]:
+            key = _riderKey(rider)
+            i = bisect_right(self._rider_keys, key)
+            self.riders.insert(i, rider)
+            self._rider_keys.insert(i, key)
+        if self._zobrist is not None:
+            self.enableHash(self._hash_decks)
         return new_player
 
-    def _sortRiders(self) -> None:
+    def _findRider(self, rider: 'Rider', key: tuple) -> int:
         '''
-        Sorts every rider by position
+        Index of a rider in the ordered index, given its current key
         '''
-        # lane criteria is negative because it can't be reversed
-        self.riders.sort(key=lambda x: (x.location[0], -x.location[1]), reverse=True)
-        
-    
+        i = bisect_left(self._rider_keys, key)
+        # Finished riders keep their location, so several riders can share a key
+        while self.riders[i] is not rider:
+            i += 1
+        return i
+
+    def _repositionRider(self, rider: 'Rider', old_key: tuple) -> None:
+        '''
+        Move a rider to its new place in the ordered index after it moved
+        Riders that share its new key stay ahead of it (same as a stable sort)
+        '''
+        i = self._findRider(rider, old_key)
+        del self.riders[i]
+        del self._rider_keys[i]
+        key = _riderKey(rider)
+        i = bisect_right(self._rider_keys, key)
+        self.riders.insert(i, rider)
+        self._rider_keys.insert(i, key)
+
+    def movementOrder(self) -> iter:
+        '''
+        Iterate over riders in movement order (front to back), as of the moment it is called
+        '''
+        return iter(tuple(self.riders))
+
+    @_undoable
     def _placeRider(self, rider: 'Rider', target: int) -> list:
         '''
-        Places a rider in a space, given the space index (and the index of the lane)
-        If unsuccessful, recursevily try to place it in an earlier space
+        Places a rider in a space, given the space index, on its first free lane
+        If the space is full, try the spaces before it (but never behind where the rider already is)
         Returns final location of rider
         '''
         # Get current location
@@ -127,115 +498,240 @@ class Course():
         if target < origin[0]:
             raise ValueError(f'{rider.color} {rider.type} cannot go backwards.')
 
-        # Condition to break the recursion: try to place it where it already is
-        if target == origin[0]:
-            return rider.location
-                
-        # Try to place it in target space
-        for i, lane in enumerate(self.spaces[target].lanes):
-            if not lane: # lane empty. Place rider there.
-                self.spaces[target].lanes[i] = rider
-                rider.location = [target, i] # Update rider's location attribute
+        # Walk back until a space has a free lane. Reaching the current space means the rider stays where it is
+        free = self._free
+        requested = target
+        while target > origin[0]:
+            if free[target]:
+                lane = (free[target] & -free[target]).bit_length() - 1 # Lowest free lane
+                if self._undo_stack is not None:
+                    origin_lanes = tuple(self.spaces[origin[0]].lanes) if origin[0] != -1 else None
+                    self._record(self._undoPlace, rider, origin, origin_lanes, tuple(self.riders), self._rider_keys[:])
+                if self._zobrist is not None:
+                    if origin[0] != -1:
+                        self._hashRider(rider, *origin)
+                    self._hashRider(rider, target, lane)
+                free[target] &= ~(1 << lane)
+                self.spaces[target].lanes[lane] = rider
+                rider.location = [target, lane] # Update rider's location attribute
+                self._indexSpace(target)
                 if origin[0] != -1: # Erase current location (but not if being placed for first time)
                     self._updateSpace(origin)
-                self._sortRiders() # Sort the list of riders by position
+                self._repositionRider(rider, _riderKey(origin)) # Keep the list of riders ordered by position
+                if self.log is not None and origin[0] == -1:
+                    self.log.placed(rider)
+                if self.profiler is not None:
+                    self.profiler.placed(requested - target)
                 return rider.location
-        # Try to place it in next available space
-        return self._placeRider(rider, target-1)
+            target -= 1
+        if self.profiler is not None:
+            self.profiler.placed(requested - target)
+        return rider.location
+
+    def _undoPlace(self, rider: 'Rider', origin: list, origin_lanes: tuple, riders: tuple, rider_keys: list) -> None:
+        '''
+        Revert _placeRider: take the rider out of its new space and restore its previous space as it was
+        '''
+        space, lane = rider.location
+        self.spaces[space].lanes[lane] = None
+        self._free[space] |= 1 << lane
+        self._indexSpace(space)
+        if origin_lanes is not None:
+            self.spaces[origin[0]].lanes[:] = origin_lanes
+            self._free[origin[0]] = self._all_free[origin[0]]
+            for i, other in enumerate(origin_lanes):
+                if other is not None:
+                    self._free[origin[0]] &= ~(1 << i)
+                    other.location[1] = i
+            self._indexSpace(origin[0])
+        rider.location = origin
+        self.riders[:] = riders
+        self._rider_keys = rider_keys
 
     def _updateSpace(self, target: list) -> None:
         '''
         Update a space after a rider moves out of it (i.e. erases rider from space and moves other to the right if needed)
         '''    
-        # Erase reference to rider from target space
-        self.spaces[target[0]].lanes[target[1]] = None
-        # Move any riders on same space to next available lanes
-        for i, lane in enumerate(self.spaces[target[0]].lanes):
-            if lane is not None:
-                lane.location[1] -= 1 # Update Rider object
-                self.spaces[target[0]].lanes[i-1], self.spaces[target[0]].lanes[i] = self.spaces[target[0]].lanes[i], None # Update Space object
+        space, lane = target
+        lanes = self.spaces[space].lanes
+        # Erase reference to rider and move the lanes to its left one lane to the right
+        lanes[lane:] = lanes[lane+1:] + [None]
+        free = self._free[space]
+        self._free[space] = (free & ((1 << lane) - 1)) | ((free >> (lane+1)) << lane) | (1 << (len(lanes)-1))
+        # Update riders that were moved
+        for i in range(lane, len(lanes)-1):
+            rider = lanes[i]
+            if rider is not None:
+                # Moving one lane to the right never changes the rider's rank, so just update its key
+                self._rider_keys[self._findRider(rider, _riderKey(rider))] = (-space, i)
+                if self._zobrist is not None:
+                    self._hashRider(rider, space, i+1)
+                    self._hashRider(rider, space, i)
+                rider.location[1] = i
+        self._indexSpace(space)
+
+    def _removeRider(self, rider: 'Rider') -> None:
+        '''
+        Take a rider off the board after crossing the finish line (its location is kept)
+        '''
+        self.spaces[rider.location[0]].lanes[rider.location[1]] = None
+        self._free[rider.location[0]] |= 1 << rider.location[1]
+        self._indexSpace(rider.location[0])
+
+    @_undoable
+    def _finishRider(self, rider: 'Rider', turn: int) -> None:
+        '''
+        Add rider to the final positions and take it off the board
+        '''
+        self._record(self._undoFinish, rider)
+        self.final_positions.append([rider, turn])
+        self._finished.add(rider)
+        self._removeRider(rider)
+        if self._zobrist is not None:
+            self._hashRider(rider, *rider.location)
+            self.hash ^= self._zobrist.finish[self._slots[rider]*MAX_RIDERS + len(self.final_positions)-1]
+        if self.log is not None:
+            self.log.finished(rider, turn)
+
+    def _undoFinish(self, rider: 'Rider') -> None:
+        self.final_positions.pop()
+        self._finished.discard(rider)
+        self.spaces[rider.location[0]].lanes[rider.location[1]] = rider
+        self._free[rider.location[0]] &= ~(1 << rider.location[1])
+        self._indexSpace(rider.location[0])
+
+    @_undoable
+    def playCard(self, rider: 'Rider', card_index: int) -> int:
+        '''
+        Rider.playCard, recorded for undo
+        '''
+        if self._undo_stack is not None:
+            self._record(self._undoPlayCard, rider, tuple(rider.hand), len(rider.discard_deck))
+        if self._zobrist is not None and self._hash_decks:
+            # The card played leaves the game, the rest of the hand is discarded
+            for i, card in enumerate(rider.hand):
+                self._countCard(rider, 2, card, -1)
+                if i != card_index:
+                    self._countCard(rider, 1, card, 1)
+        if self.log is not None:
+            card = rider.hand[card_index]
+            value = rider.playCard(card_index)
+            self.log.played(rider, card, value)
+        else:
+            value = rider.playCard(card_index)
+        return value
+
+    def _undoPlayCard(self, rider: 'Rider', hand: tuple, discard_size: int) -> None:
+        del rider.discard_deck[discard_size:]
+        rider.hand[:] = hand
+
+    @_undoable
+    def drawCards(self, rider: 'Rider') -> None:
+        '''
+        Rider.drawCards, recorded for undo
+        '''
+        if self._undo_stack is not None:
+            self._record(self._undoDrawCards, rider, tuple(rider.draw_deck), tuple(rider.discard_deck), len(rider.hand))
+        draw_size, discard_deck, hand_size = len(rider.draw_deck), rider.discard_deck, len(rider.hand)
+        rider.drawCards()
+        if self._zobrist is not None and self._hash_decks:
+            # Rider.drawCards reshuffles the discard deck into the draw deck when it has less than four cards to draw from,
+            # and conjures an exhaustion card when both decks are empty
+            if draw_size < 4:
+                for card in discard_deck:
+                    self._countCard(rider, 1, card, -1)
+                    self._countCard(rider, 0, card, 1)
+            for card in rider.hand[hand_size:]:
+                if draw_size or discard_deck:
+                    self._countCard(rider, 0, card, -1)
+                self._countCard(rider, 2, card, 1)
+        if self.log is not None:
+            self.log.drew(rider)
+
+    def _undoDrawCards(self, rider: 'Rider', draw_deck: tuple, discard_deck: tuple, hand_size: int) -> None:
+        rider.draw_deck = deque(draw_deck)
+        rider.discard_deck = list(discard_deck)
+        del rider.hand[hand_size:]
+
+    def _undoExhaustion(self, rider: 'Rider') -> None:
+        rider.discard_deck.pop()
 
     def moveRider(self, rider: 'Rider', delta: int) -> list:
         '''
         Try to move rider a given number of spaces.
         Returns the location where they actually end up
         '''
-        # Get rider location index
+        # Target index from the layout table: speed limits of the space apply (but not if slipstreaming), limited by size of the course
         origin = rider.location[0]
-        # Modify delta if location has speed min/max (but not if slipstreaming)
-        if delta != 1:
-            delta = max(self.spaces[origin].min_pw, min(self.spaces[origin].max_pw, delta))
-        # Get target index (limited by size of the course)
-        target = min(origin + delta, len(self.spaces)-1)
-        
+        target = self.layout.targets[origin][delta] if delta <= MAX_CARD else self.layout.target(origin, delta)
+
         # Place rider in new location and update all spaces and sort self.lanes
         new_location = self._placeRider(rider, target)
+        if self.log is not None:
+            self.log.moved(rider, delta == 1)
         return new_location
 
+    @_undoable
     def _applySlip(self) -> None:
         '''
         Move riders according to slipstreaming rules
-        After each peloton moves, a new peloton is formed, so function is called again recursively
+        After each peloton moves, a new peloton is formed, so pelotons are rebuilt and checked again
+        starting from the one right behind the peloton that moved (pelotons further behind are not affected)
+        A peloton on the first space and a peloton that reaches the last space take part like any other
         '''
-        # Get dictionary of pelotons
-        pelotons = self._getPelotons(pelotons={})
-        
-        # Iterate through each peloton to check if eligible for slipstream (one empty space between them + space type)
-        # Exclude last peloton from list to avoid IndexError
-        peloton_coords = list(pelotons.keys())
-        for i, coord in enumerate(peloton_coords[:-1]):
-            this_peloton_end = coord[1]
-            next_peloton_start = peloton_coords[i+1][0]
+        # Get list of pelotons from back to front
+        pelotons = list(self._getPelotons().items())
+        slip = self.layout.slip
+
+        # Check each peloton for slipstream (one empty space before the next peloton + space type)
+        # The frontmost peloton has nobody to follow
+        i = 0
+        while i < len(pelotons)-1:
+            this_peloton_end = pelotons[i][0][1]
+            next_peloton_start = pelotons[i+1][0][0]
             # Peloton eligible. Move each rider one space (if the space where they are allows it)
-            if this_peloton_end+2 == next_peloton_start and self.spaces[next_peloton_start].slip:
+            if this_peloton_end+2 == next_peloton_start and slip[next_peloton_start]:
                 any_rider_moved = False
-                for rider in pelotons[coord]:
+                for rider in pelotons[i][1]:
                     # If space where rider is does not allow slipstream, them and all behind don't move
-                    if not self.spaces[rider.location[0]].slip:
+                    if not slip[rider.location[0]]:
                         break
-                    else:
-                        self.moveRider(rider, 1)
-                        any_rider_moved = True
+                    self.moveRider(rider, 1)
+                    any_rider_moved = True
                 # If any rider moved, update pelotons
                 if any_rider_moved:
-                    return self._applySlip()
+                    pelotons = list(self._getPelotons().items())
+                    i = max(i-1, 0)
+                    continue
+            i += 1
 
-    def _getPelotons(self, pelotons: dict = {}, begin_at: int = 0) -> dict:
+    def _getPelotons(self) -> dict:
         '''
-        Recursively build a dictionary of pelotons
-        The key is the (start, end) index of each peloton
+        Build a dictionary of pelotons from the peloton index (only occupied spaces are visited)
+        The key is the (start, end) index of each peloton, from back to front
         The value is the list of riders in that peloton
         '''
-        # Initialize variables
+        if self.profiler is not None:
+            self.profiler.count('getPelotons')
+        pelotons = {}
         peloton = []
-        start = 0
-        end = -1
-        # Iterate through all spaces starting at begin_at index
-        for i in range(begin_at, len(self.spaces)):
-            # Initialize variable that determines if a rider was found this space
-            at_least_one_rider_found = False
-            
-            # Iterate through each lane to search for riders
-            riders_on_this_space = []
-            for rider in self.spaces[i].lanes: 
-                if rider is not None:
-                    riders_on_this_space.append(rider)
-                    at_least_one_rider_found = True
-                    # If first rider was found, set start index to this index
-                    if not start:
-                        start = i
+        start = end = None
+        for i in self._occupied:
+            # A gap closes the current peloton
+            if peloton and i != end+1:
+                pelotons[(start, end)] = peloton
+                peloton = []
+            if not peloton:
+                start = i
+            end = i
             # For slipstreaming each peloton is considered from back to front, but each rider has to be moved in order
             # Hence the need to insert at the beginning of the list
-            peloton = riders_on_this_space + peloton
-            
-            # If a peloton was found and we reached and empty space, set previous space as end index
-            # Call function again to find next peloton
-            if peloton and not at_least_one_rider_found:
-                end = i-1
-                pelotons[(start,end)] = peloton
-                return self._getPelotons(pelotons, end+2)
+            peloton = [rider for rider in self.spaces[i].lanes if rider is not None] + peloton
+        if peloton:
+            pelotons[(start, end)] = peloton
         return pelotons
     
+    @_undoable
     def _applyExhaustion(self, rider: 'Rider') -> bool:
         '''
         Draw an exhaustion card if lane ahead of the rider is empty
@@ -244,14 +740,77 @@ class Course():
         # Get space and lane indexes
         space, lane = rider.location[0], rider.location[1]
         # Check if there is a space ahead
-        if space+1 <= len(self.spaces)-1:
+        if space+1 <= self.layout.size-1:
             # Get lane ahead. Account for a smaller space ahead
-            lane_ahead = min(lane, len(self.spaces[space+1].lanes)-1)
-            # Check if that space is empty
-            if not self.spaces[space+1].lanes[lane_ahead]:
+            lane_ahead = min(lane, self.layout.lanes[space+1]-1)
+            # Check if that lane is empty
+            if self._free[space+1] >> lane_ahead & 1:
+                self._record(self._undoExhaustion, rider)
                 rider.drawExhaustion()
+                if self._zobrist is not None and self._hash_decks:
+                    self._countCard(rider, 1, -1, 1)
+                if self.log is not None:
+                    self.log.exhausted(rider)
                 return True
     
+    def resolveTurn(self, played_cards: dict, turn: int) -> 'TurnResult':
+        '''
+        Resolve a whole turn once every rider has played (played_cards maps riders to movement values, None for finished riders):
+        movement (front to back), slipstream, finish line, end of the race and, if the race goes on, exhaustion and new cards.
+        Riders are ordered once for the movement; finished riders are tracked in a set.
+        Returns a TurnResult
+        '''
+        profiler = self.profiler
+        # Move riders in order (front to back)
+        moves = []
+        for rider in self.movementOrder():
+            delta = played_cards.get(rider)
+            if delta: # If rider already finished, delta will be None
+                moves.append((rider, delta, tuple(self.moveRider(rider, delta))))
+        if profiler is not None:
+            profiler.lap('movement')
+
+        before_slip = [(rider, rider.location[0]) for rider in self.riders]
+        self._applySlip()
+        slipped = [rider for rider, space in before_slip if rider.location[0] != space]
+        if profiler is not None:
+            profiler.lap('slipstream')
+
+        # Register riders that crossed the finish line (arrival order == position order) and take them off the board
+        finished = [rider for rider in self.riders if rider not in self._finished and self._checkFinish(rider)]
+        for rider in finished:
+            self._finishRider(rider, turn)
+        ended = self._checkEndGame()
+        if profiler is not None:
+            profiler.lap('finish')
+        if ended:
+            self._endTurn(turn)
+            return TurnResult(moves, slipped, finished, [], True)
+
+        # Exhaustion and new cards (finished riders don't play anymore)
+        exhausted = []
+        for rider in tuple(self.riders):
+            if rider in self._finished:
+                continue
+            if self._applyExhaustion(rider):
+                exhausted.append(rider)
+            self.drawCards(rider)
+        if profiler is not None:
+            profiler.lap('exhaustion')
+        self._endTurn(turn)
+        return TurnResult(moves, slipped, finished, exhausted, False)
+
+    @_undoable
+    def _endTurn(self, turn: int) -> None:
+        '''
+        Remember the last resolved turn (policies that look ahead start from there)
+        '''
+        self._record(self._setTurn, self.turn)
+        self.turn = turn
+
+    def _setTurn(self, turn: int) -> None:
+        self.turn = turn
+
     def _checkEndGame(self) -> bool:
         '''
         Checks if at least all but one rider already finished the race
@@ -265,19 +824,44 @@ class Course():
         '''
         Check if rider crossed the finish line.
         '''
-        # Get rider space index
-        rider_location = rider.location[0]
-        if self.spaces[rider_location].type == 'finish':
-            return True
-        else:
-            return False
+        return self.layout.is_finish[rider.location[0]]
+
+    def startPositions(self) -> list:
+        '''
+        Start and breakaway spaces that still have room for a rider.
+        The last lane of a breakaway space is never available
+        '''
+        free = self._free
+        valid = [i for i in self.layout.start if free[i]]
+        # Occupied lanes of a breakaway space < lanes-1 == at least two free lanes
+        valid.extend(i for i in self.layout.breakaway if free[i] & (free[i]-1))
+        return sorted(valid)
+
+# Outcome of Course.resolveTurn
+#   moves: (rider, movement value, location after moving) in movement order
+#   slipped: riders moved by slipstream, front to back
+#   finished: riders that crossed the finish line this turn, in arrival order
+#   exhausted: riders that took an exhaustion card
+#   ended: True if the race is over
+TurnResult = namedtuple('TurnResult', ['moves', 'slipped', 'finished', 'exhausted', 'ended'])
+
+def _riderKey(rider_or_location: Union['Rider', list]) -> tuple:
+    '''
+    Sort key of the ordered rider index (ascending keys == riders from front to back)
+    '''
+    location = getattr(rider_or_location, 'location', rider_or_location)
+    return (-location[0], location[1])
 
 class Player():
     '''
     Player class. Stores the color and two Rider objects.
+    rng is the random generator used to shuffle the riders' decks (defaults to the random module itself)
     '''
-    def __init__(self, color: str) -> None:
+    __slots__ = ('color', 'rng', 'sprinteur', 'rouleur')
+
+    def __init__(self, color: str, rng: random.Random = random) -> None:
         self.color = color
+        self.rng = rng
         self.sprinteur = Rider(self, 'sprinteur')
         self.rouleur = Rider(self, 'rouleur')
     
@@ -290,10 +874,14 @@ class Rider():
     Stores a reference to its owner player, its color and type.
     Also tracks its current location on the board (an index of -1 == not yet on the board)
     Also manages the rider's deck and hand
+    The draw deck is a deque (cards are drawn from the left). Use composition() for a count-based view of the decks.
     '''
+    __slots__ = ('player', 'color', 'rng', 'type', 'location', 'discard_deck', 'draw_deck', 'hand')
+
     def __init__(self, player: 'Player', typ: str) -> None:
         self.player = player
         self.color = self.player.color
+        self.rng = self.player.rng
         self.type = typ
         self.location: list['int'] = [-1, 0] # Track rider's location (space and lane index)
         self.discard_deck = []
@@ -304,7 +892,7 @@ class Rider():
     def __repr__(self) -> str:
         return f"<Rider '{self.color} {self.type}'>"
 
-    def _buildDeck(self) -> list:
+    def _buildDeck(self) -> deque:
         '''
         Build rider deck and shuffle it.
         '''
@@ -319,28 +907,33 @@ class Rider():
             for value in range(3, 8):
                 for _ in range(3):
                     deck.append(value)
-        random.shuffle(deck)
-        return deck
+        self.rng.shuffle(deck)
+        return deque(deck)
 
     def reshuffleDeck(self) -> None:
         '''
         Transfer all cards from discard deck to draw deck again
         Reshuffle draw deck
         '''
-        self.draw_deck, self.discard_deck = self.discard_deck[:], []
-        random.shuffle(self.draw_deck)
+        self.rng.shuffle(self.discard_deck)
+        self.draw_deck, self.discard_deck = deque(self.discard_deck), []
 
     def drawCards(self) -> None:
         '''
         Draw four cards into hand
         When draw deck is empty, reshuffle discard into it
+        If both decks run out, draw whatever is left (an exhaustion card if nothing is left at all)
         '''
         for i in range(4):
             try:
-                self.hand.append(self.draw_deck.pop(0))
+                self.hand.append(self.draw_deck.popleft())
             except IndexError:
                 self.reshuffleDeck()
-                self.hand.append(self.draw_deck.pop(0))
+                if not self.draw_deck:
+                    break
+                self.hand.append(self.draw_deck.popleft())
+        if not self.hand:
+            self.hand.append(-1)
 
     def playCard(self, card_index: int) -> int:
         '''
@@ -356,7 +949,7 @@ class Rider():
         self.hand.pop(card_index)
         # Discard the whole hand
         self.discard_deck.extend(self.hand)
-        self.hand = []
+        self.hand.clear()
         return value
 
     def drawExhaustion(self) -> None:
@@ -365,35 +958,302 @@ class Rider():
         '''
         self.discard_deck.append(-1)
 
+    def composition(self) -> 'DeckComposition':
+        '''
+        Card counts of the draw and discard decks (see deck.DeckComposition)
+        '''
+        return DeckComposition.fromRider(self)
 
-def main():
+
+
+class Policy():
     '''
-    Just for testing purposes
+    Base class for the decisions a player makes during a race (used by headless races instead of user input).
+    Every decision is random by default. Subclasses override whichever choice they care about.
+    All randomness goes through course.rng so a seeded race is reproducible.
+    played holds the cards already revealed this turn (rider -> movement value), i.e. the first round cards during the second round.
     '''
-    course = Course('La Classicissima', '2-4')
-    p1 = course.addPlayer('red')
-    p2 = course.addPlayer('blue')
-    course._placeRider(p1.sprinteur, 3)
-    course._placeRider(p1.rouleur, 3)
-    course._placeRider(p2.sprinteur, 3)
-    course._placeRider(p2.rouleur, 3)
+    name = 'random'
 
-    
-    
-    print(course.spaces[0])
-    print(p1)
-    print(p1.sprinteur)
+    def placeRider(self, course: 'Course', rider: 'Rider', valid_positions: list) -> int:
+        '''
+        Return the space index where the rider starts the race
+        '''
+        return course.rng.choice(valid_positions)
 
+    def selectRider(self, course: 'Course', player: 'Player', selectable: list, played: dict = None) -> 'Rider':
+        '''
+        Return which of the selectable riders plays a card first
+        '''
+        return course.rng.choice(selectable)
 
+    def selectCard(self, course: 'Course', rider: 'Rider', played: dict = None) -> int:
+        '''
+        Return the index of the card to play from the rider's hand
+        '''
+        return course.rng.randrange(len(rider.hand))
 
-if __name__ == '__main__':
-    main()
+class GreedyPolicy(Policy):
+    '''
+    Always play the highest card available (exhaustion cards count as 2)
+    Riders furthest behind play first.
+    '''
+    name = 'greedy'
 
-    
-    
+    def selectRider(self, course: 'Course', player: 'Player', selectable: list, played: dict = None) -> 'Rider':
+        return min(selectable, key=lambda x: x.location[0])
 
-        
-        
-        
-    
+    def selectCard(self, course: 'Course', rider: 'Rider', played: dict = None) -> int:
+        values = [2 if card == -1 else card for card in rider.hand]
+        return values.index(max(values))
 
+class LazyPolicy(Policy):
+    '''
+    Get rid of exhaustion cards first, otherwise play the lowest card available.
+    '''
+    name = 'lazy'
+
+    def selectCard(self, course: 'Course', rider: 'Rider', played: dict = None) -> int:
+        if -1 in rider.hand:
+            return rider.hand.index(-1)
+        return rider.hand.index(min(rider.hand))
+
+# Registered policies, by name (names are used so they can be sent to worker processes)
+POLICIES = {policy.name: policy for policy in [Policy, GreedyPolicy, LazyPolicy]}
+
+# Same colors and order as the console interface
+PLAYER_COLORS = ['blue', 'green', 'red', 'pink', 'white', 'black']
+
+class Race():
+    '''
+    Turn flow of a race on a Course: initial placement, then two card selection rounds and the resolution of every turn.
+    Every decision is asked to a Policy object (one per player color). The flow of players without a policy is a generator
+    (see placementFlow and cardFlow) that yields their decisions, which is how game.Game waits for human players.
+    listener, if set, is called as listener(event, **data) after each step: 'placed' (rider), 'played' (rider),
+    'revealed' (cards: rider -> movement value of the first round) and 'resolved' (result: TurnResult).
+    '''
+    def __init__(self, course: 'Course', policies: dict, max_turns: int = 200) -> None:
+        self.course = course
+        self.policies = policies
+        self.max_turns = max_turns
+        self.turn = 0
+        self.exhaustion = {} # Exhaustion cards taken by every rider (rider -> count)
+        self.revealed = {} # Cards revealed to every player this turn (rider -> movement value)
+        self.listener = None
+
+    def __repr__(self) -> str:
+        return f"<Race on {self.course} - turn {self.turn}>"
+
+    def _notify(self, event: str, **data) -> None:
+        if self.listener is not None:
+            self.listener(event, **data)
+
+    def validStartPositions(self) -> list:
+        '''
+        Start and breakaway spaces that still have room for a rider (see Course.startPositions)
+        '''
+        return self.course.startPositions()
+
+    def placementFlow(self) -> iter:
+        '''
+        Initial placement of every rider, player by player.
+        Yields {'type': 'place', 'color': color, 'rider': rider type, 'options': valid spaces} for players without a policy
+        and receives the space index
+        '''
+        for player in self.course.players:
+            policy = self.policies.get(player.color)
+            for rider in [player.sprinteur, player.rouleur]:
+                valid = self.validStartPositions()
+                if policy:
+                    start_pos = policy.placeRider(self.course, rider, valid)
+                else:
+                    start_pos = yield {'type': 'place', 'color': player.color, 'rider': rider.type, 'options': valid}
+                self.course._placeRider(rider, start_pos)
+                self._notify('placed', rider=rider)
+
+    def placeRiders(self) -> None:
+        '''
+        Initial placement of every rider, player by player
+        '''
+        _runFlow(self.placementFlow())
+
+    def startTurn(self) -> None:
+        '''
+        Start the next turn (before any card is played)
+        '''
+        self.turn += 1
+        self.revealed = {}
+        if self.course.log is not None:
+            self.course.log.startTurn(self.turn)
+        if self.course.profiler is not None:
+            self.course.profiler.startTurn()
+
+    def cardFlow(self) -> iter:
+        '''
+        Two rounds where each player selects one rider and plays one card.
+        For players without a policy, yields {'type': 'rider', 'color': color, 'rider': None, 'options': rider types}
+        (only when both riders can play) and receives a rider type, then yields
+        {'type': 'card', 'color': color, 'rider': rider type, 'options': card indexes} and receives a card index
+        (decisions are public: the hand is not part of them, the player reads it from the rider).
+        Returns a dictionary with riders as keys and movement values as values (None if the rider did not play).
+        '''
+        course = self.course
+        riders_and_cards = {rider: None for rider in course.riders}
+        for i in range(2):
+            for player in course.players:
+                selectable = [rider for rider in [player.sprinteur, player.rouleur] if not course._checkFinish(rider) and not riders_and_cards[rider]]
+                if not selectable:
+                    continue
+                policy = self.policies.get(player.color)
+                if len(selectable) == 1:
+                    rider = selectable[0]
+                elif policy:
+                    rider = policy.selectRider(course, player, selectable, self.revealed)
+                else:
+                    rider_type = yield {'type': 'rider', 'color': player.color, 'rider': None, 'options': [rider.type for rider in selectable]}
+                    rider = player.sprinteur if rider_type == 'sprinteur' else player.rouleur
+                if policy:
+                    card_index = policy.selectCard(course, rider, self.revealed)
+                else:
+                    card_index = yield {'type': 'card', 'color': player.color, 'rider': rider.type, 'options': list(range(len(rider.hand)))}
+                riders_and_cards[rider] = course.playCard(rider, card_index)
+                self._notify('played', rider=rider)
+            # Cards are only revealed to the other players once the first round is over
+            self.revealed = {rider: value for rider, value in riders_and_cards.items() if value}
+            if i == 0:
+                self._notify('revealed', cards=self.revealed)
+        if course.profiler is not None:
+            course.profiler.lap('cards')
+        return riders_and_cards
+
+    def playTurn(self) -> bool:
+        '''
+        Play a single turn: cards, movement, slipstream, finish line, exhaustion and drawing new cards.
+        Return True if the race is over
+        '''
+        self.startTurn()
+        return self.resolveCards(_runFlow(self.cardFlow()))
+
+    def resolveCards(self, played_cards: dict) -> bool:
+        '''
+        Resolve the current turn once every rider has played: movement, slipstream, finish line, exhaustion and new cards.
+        Return True if the race is over
+        '''
+        result = self.course.resolveTurn(played_cards, self.turn)
+        for rider in result.exhausted:
+            self.exhaustion[rider] = self.exhaustion.get(rider, 0) + 1
+        self._notify('resolved', result=result)
+        return result.ended
+
+    def run(self) -> list:
+        '''
+        Place riders and play turns until the race is over.
+        Returns the final positions
+        '''
+        self.placeRiders()
+        while not self.playTurn():
+            if self.turn >= self.max_turns:
+                raise RuntimeError(f'{self} did not end after {self.max_turns} turns')
+        return self.course.final_positions
+
+def _runFlow(flow: iter):
+    '''
+    Run a flow of Race where every player has a policy and return its result
+    '''
+    try:
+        decision = next(flow)
+    except StopIteration as stop:
+        return stop.value
+    raise KeyError(f"No policy for player {decision['color']}")
+
+def _countRange(player_count: int) -> str:
+    '''
+    Key of courses.json variant for a given number of players
+    '''
+    return '2-4' if player_count <= 4 else '5-6'
+
+def simulateRace(course_name: str, player_count: int, policy_names: list, seed: int, tiles: list = None) -> tuple:
+    '''
+    Play a single headless race (on tiles instead of the tiles of course_name, if given).
+    policy_names has one registered policy name per seat (seat i plays color PLAYER_COLORS[i])
+    Returns (seed, number of turns, list of (color, rider type, finishing turn) in arrival order,
+    list of (color, rider type, exhaustion cards taken) in seat order)
+    '''
+    course = Course(course_name, _countRange(player_count), seed=seed, tiles=tiles)
+    policies = {}
+    for color, policy_name in zip(PLAYER_COLORS[:player_count], policy_names):
+        course.addPlayer(color)
+        policies[color] = POLICIES[policy_name]()
+    race = Race(course, policies)
+    final_positions = race.run()
+    exhaustion = [(rider.color, rider.type, race.exhaustion.get(rider, 0)) for player in course.players for rider in (player.sprinteur, player.rouleur)]
+    return seed, race.turn, [(rider.color, rider.type, turn) for rider, turn in final_positions], exhaustion
+
+def _simulateChunk(args: tuple) -> list:
+    '''
+    Worker entry point: play a contiguous range of seeds
+    '''
+    course_name, player_count, policy_names, first_seed, count = args
+    return [simulateRace(course_name, player_count, policy_names, seed) for seed in range(first_seed, first_seed+count)]
+
+def runBatch(course_name: str, player_count: int, races: int, policy_names: list = None, seed: int = 0, workers: int = None, chunk_size: int = 250) -> tuple:
+    '''
+    Play many seeded races in a process pool (races seed, seed+1, ..., seed+races-1).
+    Results do not depend on the number of workers.
+    Returns (list of simulateRace results ordered by seed, races per second)
+    '''
+    if policy_names is None:
+        policy_names = ['random'] * player_count
+    if len(policy_names) != player_count:
+        raise ValueError(f'Expected {player_count} policies, got {len(policy_names)}')
+    chunks = [(course_name, player_count, policy_names, first, min(chunk_size, seed+races-first)) for first in range(seed, seed+races, chunk_size)]
+    start = time.perf_counter()
+    results = []
+    if workers == 1:
+        for chunk in chunks:
+            results.extend(_simulateChunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk_results in executor.map(_simulateChunk, chunks):
+                results.extend(chunk_results)
+    elapsed = time.perf_counter() - start
+    return results, races / elapsed if elapsed else float('inf')
+
+
+def main():
+    '''
+    Run a batch of headless races and report throughput
+    '''
+    parser = argparse.ArgumentParser(description='Simulate Flamme Rouge races without user input.')
+    parser.add_argument('--course', default='La Classicissima')
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--races', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: one per CPU, 1 = no pool)')
+    parser.add_argument('--policies', nargs='+', default=None, choices=list(POLICIES), help='one policy per seat (a single name is used for every seat)')
+    args = parser.parse_args()
+
+    # Same checks as the console interface (see consoleUI.App._chooseCourse), as usage errors
+    courses = getCourses()
+    if args.course not in courses:
+        parser.error(f"unknown course {args.course!r} (available: {', '.join(courses)})")
+    if _countRange(args.players) not in courses[args.course]:
+        parser.error(f"{args.course} does not have a version for {args.players} players (available versions: {', '.join(courses[args.course])} players)")
+
+    policy_names = args.policies
+    if policy_names and len(policy_names) == 1:
+        policy_names = policy_names * args.players
+    results, races_per_second = runBatch(args.course, args.players, args.races, policy_names, args.seed, args.workers)
+
+    average_turns = sum(result[1] for result in results) / len(results)
+    wins = {}
+    for result in results:
+        winner = result[2][0]
+        wins[winner[:2]] = wins.get(winner[:2], 0) + 1
+    print(f'{len(results)} races on {args.course} ({args.players} players): {races_per_second:.1f} races/s, {average_turns:.2f} turns on average')
+    for (color, typ), count in sorted(wins.items(), key=lambda x: -x[1]):
+        print(f'{color} {typ}: {count/len(results):.1%} wins')
+
+
+if __name__ == '__main__':
+    main()
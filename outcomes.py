@@ -0,0 +1,158 @@
+# Exact next turn distributions (hands and positions)
+import functools
+from collections import OrderedDict
+from math import comb
+from typing import Callable
+
+from deck import DeckComposition, CARD_VALUES
+from main import Course, Rider, MAX_CARD
+
+# Movement of each card value (exhaustion cards move 2 spaces)
+MOVES = tuple(sorted({2 if value == -1 else value for value in CARD_VALUES}))
+
+@functools.lru_cache(maxsize=4096)
+def _handDistribution(draw: tuple, discard: tuple, size: int) -> dict:
+    '''
+    {sorted hand: probability} of the next hand drawn from the given count lists (see Rider.drawCards)
+    '''
+    in_draw = sum(draw)
+    if in_draw >= size:
+        return _multisets(draw, size)
+    # The whole draw deck is drawn, then the rest of the hand comes from the reshuffled discard deck
+    known = tuple(value for value, count in zip(CARD_VALUES, draw) for _ in range(count))
+    remaining = min(size - in_draw, sum(discard))
+    if not known and not remaining:
+        return {(-1,): 1.0}
+    return {tuple(sorted(known + rest)): probability for rest, probability in _multisets(discard, remaining).items()}
+
+def _multisets(pile: tuple, size: int) -> dict:
+    '''
+    Multivariate hypergeometric distribution: {sorted cards: probability} of drawing size cards out of a count list
+    '''
+    total = comb(sum(pile), size)
+    distribution = {}
+    def pick(slot: int, left: int, cards: tuple, ways: int) -> None:
+        if slot == len(pile):
+            if not left:
+                distribution[cards] = ways / total
+            return
+        for count in range(min(left, pile[slot]) + 1):
+            pick(slot+1, left-count, cards + (CARD_VALUES[slot],)*count, ways*comb(pile[slot], count))
+    pick(0, size, (), 1)
+    return distribution
+
+def handDistribution(deck: 'DeckComposition | Rider', size: int = 4) -> dict:
+    '''
+    Exact probability of every next hand of a rider (or deck composition): {sorted tuple of cards: probability}.
+    The order of the draw deck is treated as unknown. Memoized on the composition
+    '''
+    if not isinstance(deck, DeckComposition):
+        deck = DeckComposition.fromRider(deck)
+    return _handDistribution(tuple(deck.draw), tuple(deck.discard), size)
+
+class OutcomeCache():
+    '''
+    Least recently used cache of move outcomes: {local board state: {movement: space after moving and slipstreaming}}
+    '''
+    def __init__(self, maxsize: int = 65536) -> None:
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+
+    def __repr__(self) -> str:
+        return f"<OutcomeCache {len(self._entries)}/{self.maxsize} - {self.hits} hits, {self.misses} misses>"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple) -> dict:
+        outcomes = self._entries.get(key)
+        if outcomes is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return outcomes
+
+    def put(self, key: tuple, outcomes: dict) -> None:
+        self._entries[key] = outcomes
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+# Shared by every course (keys hold the layout)
+OUTCOME_CACHE = OutcomeCache()
+
+def _localState(course: 'Course', origin: int) -> tuple:
+    '''
+    Everything the outcome of a move from origin depends on: the layout and the free lanes of every space the rider
+    can reach, plus the spaces of the pelotons it can slipstream behind (a chain of pelotons one space apart)
+    '''
+    free, all_free = course._free, course._all_free
+    size = len(free)
+    # The landing space and the two after it (an empty space and the peloton to follow), then any chain of pelotons
+    end = min(origin + MAX_CARD + 3, size)
+    while end < size and (free[end-1] != all_free[end-1] or free[end-2] != all_free[end-2]):
+        end += 1
+    return course.layout, origin, tuple(free[origin:end])
+
+def moveOutcomes(course: 'Course', rider: 'Rider', cache: 'OutcomeCache' = OUTCOME_CACHE) -> dict:
+    '''
+    {movement: space where the rider ends up} for every card value, after the speed limits of moveRider and
+    Course._applySlip, with every other rider standing still. The course is left untouched
+    '''
+    origin = rider.location[0]
+    if origin == -1:
+        raise ValueError(f'{rider} is not on the course')
+    key = _localState(course, origin)
+    outcomes = cache.get(key)
+    if outcomes is None:
+        outcomes = _probe(course, rider)
+        cache.put(key, outcomes)
+    return outcomes
+
+def _probe(course: 'Course', rider: 'Rider') -> dict:
+    '''
+    Play every movement on the course itself and undo it
+    '''
+    recording = course._undo_stack is not None
+    if not recording:
+        course.startRecording()
+    log, profiler = course.log, course.profiler
+    course.log = course.profiler = None
+    try:
+        outcomes = {}
+        for value in MOVES:
+            course.moveRider(rider, value)
+            course._applySlip()
+            outcomes[value] = rider.location[0]
+            course.undo()
+            course.undo()
+    finally:
+        course.log, course.profiler = log, profiler
+        if not recording:
+            course.stopRecording()
+    return outcomes
+
+def positionDistribution(course: 'Course', rider: 'Rider', choose: 'Callable' = None, hands: dict = None) -> dict:
+    '''
+    Exact probability of every space the rider reaches next turn, after slipstreaming (other riders standing still): {space: probability}.
+    choose(hand) returns the card the rider plays from a hand (default: any card of the hand, each as likely, as a random
+    player would). hands defaults to the hand the rider has now if it holds cards, else to the distribution of its next hand
+    '''
+    if hands is None:
+        hands = {tuple(rider.hand): 1.0} if rider.hand else handDistribution(rider)
+    outcomes = moveOutcomes(course, rider)
+    distribution = {}
+    for hand, probability in hands.items():
+        if choose is None:
+            played = [(card, probability / len(hand)) for card in hand]
+        else:
+            played = [(choose(hand), probability)]
+        for card, weight in played:
+            space = outcomes[2 if card == -1 else card]
+            distribution[space] = distribution.get(space, 0.0) + weight
+    return dict(sorted(distribution.items()))
@@ -0,0 +1,183 @@
+# Starting grid placement optimizer
+import argparse
+import functools
+import math
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from main import Course, Player, Race, Rider, Policy, POLICIES, PLAYER_COLORS, _countRange
+
+# Evaluation of a start space for a rider: space index, races won by the rider's player, races played,
+# win rate and its 95% confidence interval (Wilson score interval)
+PlacementScore = namedtuple('PlacementScore', ['space', 'wins', 'races', 'win_rate', 'low', 'high'])
+
+# Worker processes shared by every evaluation, started on first use and kept until shutdown()
+_executor = None
+_executor_workers = None
+
+def wilson(successes: int, trials: int, z: float = 1.96) -> tuple:
+    '''
+    Wilson score interval of a proportion (z = 1.96 for 95% confidence)
+    '''
+    if not trials:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z*z/trials
+    centre = (p + z*z/(2*trials)) / denominator
+    half_width = z * math.sqrt(p*(1-p)/trials + z*z/(4*trials*trials)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+class GridPolicy(Policy):
+    '''
+    Policy that puts some riders on fixed start spaces ((color, rider type) -> space index)
+    and delegates every other decision to another policy
+    '''
+    def __init__(self, policy: 'Policy', grid: dict) -> None:
+        self.policy = policy
+        self.grid = grid
+
+    def placeRider(self, course: 'Course', rider: 'Rider', valid_positions: list) -> int:
+        if (rider.color, rider.type) in self.grid:
+            return self.grid[rider.color, rider.type]
+        return self.policy.placeRider(course, rider, valid_positions)
+
+    def selectRider(self, course: 'Course', player: 'Player', selectable: list, played: dict = None) -> 'Rider':
+        return self.policy.selectRider(course, player, selectable, played)
+
+    def selectCard(self, course: 'Course', rider: 'Rider', played: dict = None) -> int:
+        return self.policy.selectCard(course, rider, played)
+
+def _newCourse(course_name: str, colors: tuple, seed: int = None) -> 'Course':
+    course = Course(course_name, _countRange(len(colors)), seed=seed)
+    for color in colors:
+        course.addPlayer(color)
+    return course
+
+def candidates(course_name: str, colors: tuple, placed: tuple = ()) -> list:
+    '''
+    Start spaces still available after the riders of placed ((color, rider type, space) in placement order) took their places
+    '''
+    course = _newCourse(course_name, colors)
+    riders = {(rider.color, rider.type): rider for rider in course.riders}
+    for color, rider_type, space in placed:
+        course._placeRider(riders[color, rider_type], space)
+    return course.startPositions()
+
+def _playPlacements(args: tuple) -> int:
+    '''
+    Worker entry point: play seeded races with a fixed partial grid and return how many of them the given color won
+    '''
+    course_name, colors, policy_names, grid, color, first_seed, count = args
+    wins = 0
+    for seed in range(first_seed, first_seed+count):
+        course = _newCourse(course_name, colors, seed)
+        policies = {seat: GridPolicy(POLICIES[name](), grid) for seat, name in zip(colors, policy_names)}
+        final_positions = Race(course, policies).run()
+        wins += final_positions[0][0].color == color
+    return wins
+
+@functools.lru_cache(maxsize=1024)
+def _evaluate(course_name: str, colors: tuple, policy_names: tuple, placed: tuple, rider: tuple, races: int, seed: int, workers: int) -> tuple:
+    '''
+    Scores of every available start space for rider ((color, rider type)). Memoized per course, seating, policies and partial grid
+    '''
+    color = rider[0]
+    grid = {(placed_color, rider_type): space for placed_color, rider_type, space in placed}
+    spaces = candidates(course_name, colors, placed)
+    # Every space is played on the same seeds (common random numbers), split so that every worker gets some of every space
+    chunk_size = -(-races // max(1, min(races, workers or os.cpu_count() or 1)))
+    firsts = range(seed, seed+races, chunk_size)
+    tasks = [(course_name, colors, policy_names, {**grid, rider: space}, color, first, min(chunk_size, seed+races-first))
+             for space in spaces for first in firsts]
+    if workers == 1:
+        wins = [_playPlacements(task) for task in tasks]
+    else:
+        wins = list(_pool(workers).map(_playPlacements, tasks))
+    scores = []
+    for i, space in enumerate(spaces):
+        space_wins = sum(wins[i*len(firsts):(i+1)*len(firsts)])
+        scores.append(PlacementScore(space, space_wins, races, space_wins / races, *wilson(space_wins, races)))
+    return tuple(sorted(scores, key=lambda x: (-x.win_rate, x.space)))
+
+def _pool(workers: int) -> 'ProcessPoolExecutor':
+    '''
+    The shared worker pool, restarted if a different number of workers is asked for
+    '''
+    global _executor, _executor_workers
+    if _executor is None or workers != _executor_workers:
+        shutdown()
+        _executor = ProcessPoolExecutor(max_workers=workers)
+        _executor_workers = workers
+    return _executor
+
+def shutdown() -> None:
+    '''
+    Shut down the worker processes (if any)
+    '''
+    global _executor
+    if _executor:
+        _executor.shutdown()
+        _executor = None
+
+def bestPlacements(course_name: str, colors: list, rider: tuple, placed: list = (), policy_names: list = None, races: int = 100, seed: int = 0, workers: int = None) -> list:
+    '''
+    Rank the start spaces available to a rider by the share of races its player wins when it starts there.
+        colors: every player, in placement order (seat order)
+        rider: (color, rider type) of the rider being placed
+        placed: (color, rider type, space) of the riders already on the grid, in placement order
+        policy_names: one policy per seat, used for the races and for placing the riders that are not on the grid yet
+    Every space is evaluated on the same seeds in a process pool (workers == 1: no pool), which stays up for the next calls
+    until shutdown().
+    Results are cached per (course, players, policies, riders already placed).
+    Returns a list of PlacementScore, best first
+    '''
+    colors = tuple(colors)
+    policy_names = tuple(policy_names or ['greedy'] * len(colors))
+    if len(policy_names) != len(colors):
+        raise ValueError(f'Expected {len(colors)} policies, got {len(policy_names)}')
+    placed = tuple(tuple(placement) for placement in placed)
+    if any(tuple(rider) == placement[:2] for placement in placed):
+        raise ValueError(f'{rider[0]} {rider[1]} is already placed')
+    return list(_evaluate(course_name, colors, policy_names, placed, tuple(rider), races, seed, workers))
+
+def report(scores: list) -> str:
+    '''
+    One line per start space: win rate and confidence interval
+    '''
+    return '\n'.join(f'{score.space:>3}: {score.win_rate:>6.1%} wins ({score.low:.1%}-{score.high:.1%}, {score.races} races)' for score in scores)
+
+def main():
+    '''
+    Rank the start spaces available to a rider
+    '''
+    parser = argparse.ArgumentParser(description='Evaluate Flamme Rouge starting grid placements by simulation.')
+    parser.add_argument('--course', default='La Classicissima')
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--rider', default='blue.sprinteur', metavar='COLOR.TYPE', help='rider being placed')
+    parser.add_argument('--placed', nargs='*', default=[], metavar='COLOR.TYPE=SPACE', help='riders already on the grid, in placement order')
+    parser.add_argument('--policies', nargs='+', default=None, choices=list(POLICIES), help='one policy per seat (a single name is used for every seat)')
+    parser.add_argument('--races', type=int, default=100, help='races played on every start space')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: one per CPU, 1 = no pool)')
+    args = parser.parse_args()
+
+    policy_names = args.policies
+    if policy_names and len(policy_names) == 1:
+        policy_names = policy_names * args.players
+    placed = []
+    for placement in args.placed:
+        rider, space = placement.split('=')
+        placed.append((*rider.split('.'), int(space)))
+    start = time.perf_counter()
+    try:
+        scores = bestPlacements(args.course, PLAYER_COLORS[:args.players], tuple(args.rider.split('.')), placed, policy_names, args.races, args.seed, args.workers)
+    finally:
+        shutdown()
+    print(f'{args.rider} on {args.course} ({args.players} players), evaluated in {time.perf_counter()-start:.1f} s:')
+    print(report(scores))
+
+
+if __name__ == '__main__':
+    main()
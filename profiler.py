@@ -0,0 +1,148 @@
+# Turn pipeline profiling
+import argparse
+import time
+
+from main import Course, Race, POLICIES, PLAYER_COLORS, _countRange
+
+# Turn phases, in the order they are played
+PHASES = ('cards', 'movement', 'slipstream', 'finish', 'exhaustion')
+# Internal events counted by Course
+COUNTERS = ('placeRider', 'getPelotons')
+
+class TurnProfiler():
+    '''
+    Wall time and call counts of each turn phase, plus counts of internal Course events.
+    Attach it with course.profiler = TurnProfiler(); Race (and so game.Game) marks the end of each phase with lap(),
+    Course reports _placeRider (with the number of spaces it had to walk back, the depth of the placement),
+    and _getPelotons calls. When course.profiler is None, every hook is a single attribute check.
+    Times are also kept as histograms with power of two buckets (bucket b holds times from 2**(b-1) to 2**b microseconds),
+    and the placement depths as a histogram by depth, so profiles of many races can be merged.
+    '''
+    def __init__(self) -> None:
+        self.turns = 0
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.time_histograms = {phase: {} for phase in PHASES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.depths = {}
+        self._last = time.perf_counter()
+
+    def __repr__(self) -> str:
+        return f"<TurnProfiler {self.turns} turns>"
+
+    def startTurn(self) -> None:
+        self.turns += 1
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        '''
+        Add the time since the last lap (or turn start) to a phase
+        '''
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self.times[phase] += elapsed
+        self.calls[phase] += 1
+        bucket = int(elapsed*1e6).bit_length()
+        histogram = self.time_histograms[phase]
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+
+    def count(self, counter: str) -> None:
+        self.counters[counter] += 1
+
+    def placed(self, depth: int) -> None:
+        self.counters['placeRider'] += 1
+        self.depths[depth] = self.depths.get(depth, 0) + 1
+
+    def merge(self, other: 'TurnProfiler') -> None:
+        '''
+        Add the data of another profiler (e.g. of another race) to this one
+        '''
+        self.turns += other.turns
+        for phase in PHASES:
+            self.times[phase] += other.times[phase]
+            self.calls[phase] += other.calls[phase]
+            for bucket, count in other.time_histograms[phase].items():
+                self.time_histograms[phase][bucket] = self.time_histograms[phase].get(bucket, 0) + count
+        for counter in COUNTERS:
+            self.counters[counter] += other.counters[counter]
+        for depth, count in other.depths.items():
+            self.depths[depth] = self.depths.get(depth, 0) + count
+
+    def summary(self) -> dict:
+        '''
+        Totals as a JSON serializable dictionary
+        '''
+        return {
+            'turns': self.turns,
+            'phases': {phase: {'calls': self.calls[phase], 'seconds': self.times[phase],
+                               'mean_us': self.times[phase] / self.calls[phase] * 1e6 if self.calls[phase] else 0.0}
+                       for phase in PHASES},
+            'counters': dict(self.counters),
+            'per_turn': {counter: count / self.turns if self.turns else 0.0 for counter, count in self.counters.items()},
+        }
+
+    def histogram(self) -> dict:
+        '''
+        Histograms as a JSON serializable dictionary: {phase: {upper bound in microseconds: count}, 'placement depth': {depth: count}}
+        '''
+        histograms = {phase: {2**bucket: count for bucket, count in sorted(self.time_histograms[phase].items())} for phase in PHASES}
+        histograms['placement depth'] = dict(sorted(self.depths.items()))
+        return histograms
+
+    def report(self, width: int = 40) -> str:
+        '''
+        Text report of the summary and histograms
+        '''
+        summary = self.summary()
+        lines = [f'{self.turns} turns']
+        total = sum(self.times.values()) or 1
+        for phase, data in summary['phases'].items():
+            lines.append(f"{phase:<12} {data['calls']:>8} calls {data['mean_us']:>10.1f} us/call {self.times[phase]/total:>7.1%}")
+        for counter, count in summary['counters'].items():
+            lines.append(f"{counter:<12} {count:>8} calls {summary['per_turn'][counter]:>10.2f} per turn")
+        for name, histogram in self.histogram().items():
+            lines.append(f'{name}:')
+            peak = max(histogram.values(), default=1)
+            unit = '' if name == 'placement depth' else ' us'
+            for bound, count in histogram.items():
+                lines.append(f"  {'<=' if unit else ''}{bound:>7}{unit:<3} {'#'*max(1, round(count/peak*width)):<{width}} {count}")
+        return '\n'.join(lines)
+
+def profileRaces(course_name: str, player_count: int, races: int, policy_names: list = None, seed: int = 0) -> 'TurnProfiler':
+    '''
+    Play seeded races (in this process) with a profiler attached and return the merged profile
+    '''
+    if policy_names is None:
+        policy_names = ['random'] * player_count
+    total = TurnProfiler()
+    for race_seed in range(seed, seed+races):
+        course = Course(course_name, _countRange(player_count), seed=race_seed)
+        colors = PLAYER_COLORS[:player_count]
+        for color in colors:
+            course.addPlayer(color)
+        course.profiler = TurnProfiler()
+        Race(course, {color: POLICIES[name]() for color, name in zip(colors, policy_names)}).run()
+        total.merge(course.profiler)
+    return total
+
+def main():
+    '''
+    Profile a batch of headless races
+    '''
+    parser = argparse.ArgumentParser(description='Profile the turn pipeline of Flamme Rouge races.')
+    parser.add_argument('--course', default='La Classicissima')
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--races', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--policies', nargs='+', default=None, choices=list(POLICIES), help='one policy per seat (a single name is used for every seat)')
+    args = parser.parse_args()
+
+    policy_names = args.policies
+    if policy_names and len(policy_names) == 1:
+        policy_names = policy_names * args.players
+    print(profileRaces(args.course, args.players, args.races, policy_names, args.seed).report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+# Binary race log and replay
+import struct
+
+from board import Board
+from main import Course, Rider, _countRange
+
+MAGIC = b'FRLG'
+VERSION = 2
+
+# Event types
+TURN = 0 # arg: turn number
+PLACE = 1 # arg: space, v0: lane
+MOVE = 2 # arg: space, v0: lane (after the move)
+SLIP = 3 # arg: space, v0: lane (after the move)
+CARD = 4 # v0: card played (-1 == exhaustion), v1: movement value
+HAND = 5 # arg: number of cards, v0-v3: cards
+EXHAUSTION = 6
+FINISH = 7 # arg: finishing turn, v0: arrival rank
+CHECKPOINT = 8 # arg: size of the checkpoint bytes that follow the record
+END = 9 # arg: last turn
+
+# Every event is a fixed-size record: type, rider id, arg, v0, v1, v2, v3
+RECORD = struct.Struct('<BBhbbbb')
+# Header: magic, version, number of riders, checkpoint interval, size of course name, size of player count range
+# (followed by the name, the range, the player colors and the tile ids of the course)
+HEADER = struct.Struct('<4sBBHBB')
+# Footer: offset of the checkpoint index, number of checkpoints
+FOOTER = struct.Struct('<II')
+# Checkpoint index entry: turn, offset of the CHECKPOINT record
+INDEX = struct.Struct('<HI')
+HAND_SIZE = 4
+NO_RIDER = 255
+
+class RaceLogger():
+    '''
+    Write the events of a race as fixed-size binary records (8 bytes each).
+    Attach it to a course before riders are placed (players must already be added); Course and Race
+    report every placement, card, move, slip, exhaustion card, new hand and finish through it.
+    A full checkpoint of the state (board, hands, exhaustion cards, final positions) is written at the start of the race
+    and at the start of every checkpoint_every turns, so a RaceLog can seek to any turn without replaying the whole race.
+    Rider ids follow the order of course.players (sprinteur, then rouleur), as in board.Board.
+    '''
+    def __init__(self, course: 'Course', checkpoint_every: int = 10) -> None:
+        self.course = course
+        self.checkpoint_every = checkpoint_every
+        self.riders = []
+        for player in course.players:
+            self.riders.extend([player.sprinteur, player.rouleur])
+        self.ids = {rider: rider_id for rider_id, rider in enumerate(self.riders)}
+        self.exhaustion = [0] * len(self.riders) # Exhaustion cards taken since the logger was attached
+        self.turn = 0
+        self.index = []
+        name = course.name.encode()
+        count_range = _countRange(course.max_players).encode()
+        colors = ','.join(player.color for player in course.players).encode()
+        self.data = bytearray(HEADER.pack(MAGIC, VERSION, len(self.ids), checkpoint_every, len(name), len(count_range)))
+        # Tile ids, so courses built from a tile list (e.g. by generator.py) can be rebuilt too
+        tiles = ','.join(course.layout.tile_ids).encode()
+        self.data += name + count_range + struct.pack('<B', len(colors)) + colors + struct.pack('<H', len(tiles)) + tiles
+        course.log = self
+        self._checkpoint()
+
+    def __repr__(self) -> str:
+        return f"<RaceLogger '{self.course.name}' - {len(self.data)} bytes>"
+
+    def _write(self, event: int, rider: 'Rider' = None, arg: int = 0, v0: int = 0, v1: int = 0, v2: int = 0, v3: int = 0) -> None:
+        self.data += RECORD.pack(event, NO_RIDER if rider is None else self.ids[rider], arg, v0, v1, v2, v3)
+
+    def _checkpoint(self) -> None:
+        state = encodeState(Board.fromCourse(self.course), [rider.hand for rider in self.riders], self.exhaustion,
+                            [(self.ids[rider], turn) for rider, turn in self.course.final_positions])
+        self.index.append((self.turn, len(self.data)))
+        self._write(CHECKPOINT, arg=len(state))
+        self.data += state
+
+    def startTurn(self, turn: int) -> None:
+        self.turn = turn
+        if turn % self.checkpoint_every == 0:
+            self._checkpoint()
+        self._write(TURN, arg=turn)
+
+    def placed(self, rider: 'Rider') -> None:
+        self._write(PLACE, rider, *rider.location)
+
+    def moved(self, rider: 'Rider', slipstream: bool) -> None:
+        self._write(SLIP if slipstream else MOVE, rider, *rider.location)
+
+    def played(self, rider: 'Rider', card: int, value: int) -> None:
+        self._write(CARD, rider, 0, card, value)
+
+    def drew(self, rider: 'Rider') -> None:
+        cards = (rider.hand + [0]*HAND_SIZE)[:HAND_SIZE]
+        self._write(HAND, rider, len(rider.hand), *cards)
+
+    def exhausted(self, rider: 'Rider') -> None:
+        self.exhaustion[self.ids[rider]] += 1
+        self._write(EXHAUSTION, rider)
+
+    def finished(self, rider: 'Rider', turn: int) -> None:
+        self._write(FINISH, rider, turn, len(self.course.final_positions))
+
+    def close(self) -> bytes:
+        '''
+        Stop logging and return the complete log (events, checkpoint index and footer)
+        '''
+        self._write(END, arg=self.turn)
+        index_offset = len(self.data)
+        for turn, offset in self.index:
+            self.data += INDEX.pack(turn, offset)
+        self.data += FOOTER.pack(index_offset, len(self.index))
+        if self.course.log is self:
+            self.course.log = None
+        return bytes(self.data)
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as f:
+            f.write(self.close())
+
+def encodeState(board: 'Board', hands: list, exhaustion: list, final_positions: list) -> bytes:
+    '''
+    Checkpoint bytes: board key, then hand size + cards and exhaustion count of each rider, then final positions
+    '''
+    data = bytearray(board.key())
+    for hand, exhausted in zip(hands, exhaustion):
+        data += struct.pack('<Bbbbb', len(hand), *(list(hand) + [0]*HAND_SIZE)[:HAND_SIZE])
+        data += struct.pack('<B', exhausted)
+    data += struct.pack('<B', len(final_positions))
+    for rider_id, turn in final_positions:
+        data += struct.pack('<BH', rider_id, turn)
+    return bytes(data)
+
+class ReplayState():
+    '''
+    State of a logged race at the start of a turn
+        board: board.Board with the position of every rider (finished riders are off the grid)
+        hands: cards in the hand of each rider
+        exhaustion: number of exhaustion cards each rider took
+        final_positions: list of (rider id, finishing turn) in arrival order
+    '''
+    def __init__(self, board: 'Board', turn: int = 0) -> None:
+        self.board = board
+        self.turn = turn
+        self.hands = [[] for _ in board.riders]
+        self.exhaustion = [0] * len(board.riders)
+        self.final_positions = []
+
+    def __repr__(self) -> str:
+        return f"<ReplayState turn {self.turn} - {len(self.final_positions)} finished>"
+
+    def decode(self, data: bytes) -> None:
+        '''
+        Set the state from checkpoint bytes (see encodeState)
+        '''
+        board = self.board
+        offset = len(board.key())
+        board.restore(data[:offset])
+        for rider_id in range(len(board.riders)):
+            size, *cards = struct.unpack_from('<Bbbbb', data, offset)
+            self.hands[rider_id] = cards[:size]
+            self.exhaustion[rider_id] = data[offset+5]
+            offset += 6
+        self.final_positions = [struct.unpack_from('<BH', data, offset+1+3*i) for i in range(data[offset])]
+
+    def apply(self, event: int, rider_id: int, arg: int, v0: int, v1: int, v2: int, v3: int) -> None:
+        '''
+        Apply one logged event
+        '''
+        if event == TURN:
+            self.turn = arg
+        elif event in (PLACE, MOVE, SLIP):
+            # Placement is deterministic, so landing on the logged space reproduces the logged lane (and lane shifts)
+            self.board.placeRider(rider_id, arg)
+        elif event == CARD:
+            self.hands[rider_id] = []
+        elif event == HAND:
+            self.hands[rider_id] = [v0, v1, v2, v3][:arg]
+        elif event == EXHAUSTION:
+            self.exhaustion[rider_id] += 1
+        elif event == FINISH:
+            self.board.removeRider(rider_id)
+            self.final_positions.append((rider_id, arg))
+
+class RaceLog():
+    '''
+    Read a log written by RaceLogger
+    '''
+    def __init__(self, data: bytes) -> None:
+        magic, version, rider_count, self.checkpoint_every, name_size, range_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a race log (or unsupported version)')
+        self.data = data
+        offset = HEADER.size
+        self.course_name = data[offset:offset+name_size].decode()
+        offset += name_size
+        self.player_count = data[offset:offset+range_size].decode()
+        offset += range_size
+        self.colors = data[offset+1:offset+1+data[offset]].decode().split(',')
+        offset += 1 + data[offset]
+        tiles_size, = struct.unpack_from('<H', data, offset)
+        self.tiles = data[offset+2:offset+2+tiles_size].decode().split(',')
+        self._start = offset + 2 + tiles_size
+        self._end, checkpoints = FOOTER.unpack_from(data, len(data) - FOOTER.size)
+        self.checkpoints = [INDEX.unpack_from(data, self._end + i*INDEX.size) for i in range(checkpoints)]
+        # Spaces of the course (to build boards)
+        self._spaces = Course(self.course_name, self.player_count, tiles=self.tiles).spaces
+        self.riders = tuple((color, rider_type) for color in self.colors for rider_type in ('sprinteur', 'rouleur'))
+        if len(self.riders) != rider_count:
+            raise ValueError(f'Expected {rider_count} riders, got {len(self.riders)}')
+
+    def __repr__(self) -> str:
+        return f"<RaceLog '{self.course_name}' - {len(self.riders)} riders - {len(self.data)} bytes>"
+
+    @classmethod
+    def load(cls, path: str) -> 'RaceLog':
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    def _records(self, offset: int) -> iter:
+        '''
+        Iterate over (offset, record) from offset until the end of the events
+        '''
+        data = self.data
+        while offset < self._end:
+            record = RECORD.unpack_from(data, offset)
+            yield offset, record
+            offset += RECORD.size
+            if record[0] == CHECKPOINT:
+                offset += record[2]
+
+    def events(self) -> iter:
+        '''
+        Iterate over the events as (type, rider id, arg, v0, v1, v2, v3), checkpoints excluded
+        '''
+        for _, record in self._records(self._start):
+            if record[0] != CHECKPOINT:
+                yield record
+
+    @property
+    def turns(self) -> int:
+        return RECORD.unpack_from(self.data, self._end - RECORD.size)[2]
+
+    def stateAt(self, turn: int) -> 'ReplayState':
+        '''
+        State at the start of a turn, before any card is played (the state at the start of turn 1 includes the initial placement).
+        Turns after the end of the race return the final state.
+        '''
+        checkpoint_turn, offset = max(entry for entry in self.checkpoints if entry[0] <= turn)
+        state = ReplayState(Board(self._spaces, self.riders), checkpoint_turn)
+        size = RECORD.unpack_from(self.data, offset)[2]
+        state.decode(self.data[offset+RECORD.size:offset+RECORD.size+size])
+        for _, record in self._records(offset + RECORD.size + size):
+            if record[0] == TURN and record[2] >= turn:
+                state.turn = turn
+                break
+            state.apply(*record)
+        return state
@@ -0,0 +1,120 @@
+# Incremental board rendering
+from console import fg, fx
+from main import Course, Rider
+
+# Make black color readable on console
+fg.black = fg.darkgray
+
+# Save / restore cursor position, move cursor up n lines, move cursor to column n
+SAVE_CURSOR = '\x1b7'
+RESTORE_CURSOR = '\x1b8'
+CURSOR_UP = '\x1b[{}A'
+CURSOR_COLUMN = '\x1b[{}G'
+
+def _emptyCell(space_type: str) -> str:
+    '''
+    Glyph of an empty lane of a given space type
+    '''
+    if space_type == 'uphill':
+        return ' ' + fg.red + '|' + fx.default
+    elif space_type == 'downhill':
+        return ' ' + fg.blue + '|' + fx.default
+    elif space_type == 'cobble':
+        return ' ' + fg.yellowgreen + '|' + fx.default
+    elif space_type == 'supply':
+        return ' ' + fg.cyan + '|' + fx.default
+    elif space_type in ['start', 'finish']:
+        return ' ' + fg.yellow + '|' + fx.default
+    elif space_type == 'breakaway_lane': # Colored breakaway lanes
+        return ' ' + fg.goldenrod + '|' + fx.default
+    else:
+        return ' ' + fx.default + '|'
+
+class CourseRenderer():
+    '''
+    Draw the board state of a course as a straight line, using three lines (one for each potential lane).
+    The frame is kept as a list of cells (one string per lane of every space). Each call to render() only
+    re-renders the spaces that had riders on them in the previous frame or have riders on them now,
+    and rebuilds the lines with join. Glyphs are cached per (space type, occupant).
+    renderChanges() returns only the cells that changed since the last frame, as ANSI cursor moves,
+    for terminals that still show the previous frame right above the cursor.
+    '''
+    def __init__(self, course: 'Course') -> None:
+        self.course = course
+        spaces = course.spaces
+        # Lane shown by each line (top to bottom). Skip the top line if no space has three lanes
+        self.rows = (2, 1, 0) if any(len(space.lanes) == 3 for space in spaces) else (1, 0)
+        # Empty glyph of every cell (None == space has no such lane)
+        self._empty = {}
+        for i, space in enumerate(spaces):
+            for lane in range(len(space.lanes)):
+                if space.type == 'breakaway' and (lane == 0 or (lane == 1 and len(space.lanes) == 3)):
+                    self._empty[i, lane] = _emptyCell('breakaway_lane')
+                else:
+                    self._empty[i, lane] = _emptyCell(space.type)
+        self._glyphs = {}
+        # Current frame: cells of each line and occupant of each cell
+        self.lines = {lane: [self._empty.get((i, lane), '  ') for i in range(len(spaces))] for lane in self.rows}
+        self._occupants = {}
+        self._previous = set() # Spaces with riders on the last frame
+        self._changed = []
+        self.border = '#'*(len(spaces)*2+1)
+
+    def __repr__(self) -> str:
+        return f"<CourseRenderer '{self.course.name}'>"
+
+    def _glyph(self, space: int, lane: int, rider: 'Rider') -> str:
+        empty = self._empty[space, lane]
+        if rider is None:
+            return empty
+        key = (empty, rider.color, rider.type)
+        glyph = self._glyphs.get(key)
+        if glyph is None:
+            glyph = self._glyphs[key] = empty.replace(' ', getattr(fg, rider.color) + rider.type[0])
+        return glyph
+
+    def update(self) -> list:
+        '''
+        Bring the frame up to date with the course.
+        Returns the list of (line, space) cells that changed
+        '''
+        spaces = self.course.spaces
+        occupied = set(self.course._occupied)
+        changed = []
+        for i in occupied | self._previous:
+            for lane, rider in enumerate(spaces[i].lanes):
+                if self._occupants.get((i, lane)) is not rider:
+                    self._occupants[i, lane] = rider
+                    if lane in self.lines:
+                        self.lines[lane][i] = self._glyph(i, lane, rider)
+                        changed.append((lane, i))
+        self._previous = occupied
+        self._changed.extend(changed)
+        return changed
+
+    def render(self) -> str:
+        '''
+        Full frame as a string
+        '''
+        self.update()
+        self._changed = []
+        lines = [self.border]
+        lines.extend('>' + ''.join(self.lines[lane]) for lane in self.rows)
+        lines.append(self.border)
+        return '\n'.join(lines)
+
+    def renderChanges(self) -> str:
+        '''
+        ANSI sequence that redraws only the cells changed since the last frame.
+        Assumes the last frame was printed right above the cursor (followed by a new line)
+        '''
+        self.update()
+        height = len(self.rows) + 2
+        output = [SAVE_CURSOR]
+        for lane, i in self._changed:
+            output.append(CURSOR_UP.format(height - 1 - self.rows.index(lane)))
+            output.append(CURSOR_COLUMN.format(2*i + 2))
+            output.append(self.lines[lane][i])
+            output.append(RESTORE_CURSOR)
+        self._changed = []
+        return ''.join(output) if len(output) > 1 else ''
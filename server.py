@@ -0,0 +1,168 @@
+# Multi-game asyncio server
+import argparse
+import asyncio
+import itertools
+import json
+
+from bots import registerPolicies
+from game import Game
+from main import POLICIES
+
+# Computer players can be created with any registered policy, the ISMCTS bot included
+registerPolicies()
+
+class GameServer():
+    '''
+    Host many games in a single process. Clients talk JSON, one object per line.
+    Requests (every reply echoes the "id" of the request, if given):
+        {"cmd": "create", "course": name, "players": n, "bots": {color: policy name}, "seed": int} -> {"game": game id}
+        {"cmd": "join", "game": id, "color": color} -> subscribe to the events of a game (color == None to spectate)
+        {"cmd": "play", "game": id, "color": color, "answer": answer} -> answer the pending decision of a game
+        {"cmd": "state", "game": id, "color": color} -> public state (plus the hands of color's riders, if the client joined as color)
+        {"cmd": "list"} -> open games
+    Events of a game are pushed to every client that joined it as {"game": id, "event": ...}.
+    Games run their computer players in a thread pool (one game at a time per game), so a slow bot never blocks the event loop.
+    Finished games are dropped once their last client leaves.
+    '''
+    def __init__(self) -> None:
+        self.games = {}
+        self.locks = {}
+        self.clients = {} # game id -> set of stream writers
+        self._ids = itertools.count(1)
+
+    def __repr__(self) -> str:
+        return f"<GameServer {len(self.games)} games>"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''
+        Serve one client connection
+        '''
+        joined = {} # game id -> color the client joined as (None == spectator)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = {}
+                try:
+                    request = json.loads(line)
+                    reply = await self.dispatch(request, writer, joined)
+                except Exception as err:
+                    # Bad requests and errors of the game itself (full course, failing computer player...) are answered, not fatal
+                    reply = {'error': str(err) or type(err).__name__}
+                if 'id' in request:
+                    reply['id'] = request['id']
+                self._send(writer, reply)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in joined:
+                self.clients[game_id].discard(writer)
+                self._cleanUp(game_id)
+            writer.close()
+
+    async def dispatch(self, request: dict, writer: asyncio.StreamWriter, joined: dict) -> dict:
+        command = request['cmd']
+        if command == 'list':
+            games = []
+            for game_id, game in list(self.games.items()):
+                lock = self.locks.get(game_id)
+                if lock is None: # Dropped meanwhile
+                    continue
+                async with lock:
+                    if not game.over:
+                        games.append({'game': game_id, 'course': game.course.name, 'players': game.colors, 'turn': game.race.turn})
+            return {'games': games}
+        if command == 'create':
+            return {'game': await self.create(request['course'], request['players'], request.get('bots', {}), request.get('seed'))}
+        game_id = request['game']
+        if game_id not in self.games:
+            raise KeyError(f'No game {game_id}')
+        game = self.games[game_id]
+        # Snapshots are taken between two steps of the game, never while a worker thread is advancing it
+        if command == 'join':
+            async with self.locks[game_id]:
+                state = game.state(request.get('color'))
+                # Subscribed in the same step, so the client gets every event that happens after its snapshot
+                self.clients[game_id].add(writer)
+            joined[game_id] = request.get('color')
+            return {'game': game_id, 'state': state}
+        if command == 'state':
+            # Hands are private
+            if request.get('color') is not None and joined.get(game_id) != request['color']:
+                raise ValueError(f"Join game {game_id} as {request['color']} to see its hands")
+            async with self.locks[game_id]:
+                return {'game': game_id, 'state': game.state(request.get('color'))}
+        if command == 'play':
+            await self.play(game_id, request['color'], request['answer'])
+            return {'game': game_id, 'ok': True}
+        raise ValueError(f'Unknown command {command}')
+
+    async def create(self, course_name: str, player_count: int, bot_names: dict, seed: int = None) -> int:
+        bots_by_color = {color: POLICIES[name]() for color, name in bot_names.items()}
+        game = Game(course_name, player_count, bots_by_color, seed)
+        game_id = next(self._ids)
+        self.games[game_id] = game
+        self.locks[game_id] = asyncio.Lock()
+        self.clients[game_id] = set()
+        # Computer players may have to play before the first human decision
+        try:
+            await self._run(game_id, game.start)
+        except Exception:
+            for registry in (self.games, self.locks, self.clients):
+                del registry[game_id]
+            raise
+        return game_id
+
+    async def play(self, game_id: int, color: str, answer) -> None:
+        try:
+            await self._run(game_id, self.games[game_id].submit, color, answer)
+        finally:
+            self._cleanUp(game_id)
+
+    async def _run(self, game_id: int, function: callable, *args) -> None:
+        '''
+        Advance a game in a worker thread and push the resulting events
+        '''
+        async with self.locks[game_id]:
+            events = await asyncio.get_running_loop().run_in_executor(None, function, *args)
+        for event in events:
+            self._broadcast(game_id, event)
+
+    def _broadcast(self, game_id: int, event: dict) -> None:
+        for writer in list(self.clients[game_id]):
+            self._send(writer, {'game': game_id, **event})
+
+    def _send(self, writer: asyncio.StreamWriter, message: dict) -> None:
+        if not writer.is_closing():
+            writer.write(json.dumps(message).encode() + b'\n')
+
+    def _cleanUp(self, game_id: int) -> None:
+        if game_id in self.games and self.games[game_id].over and not self.clients[game_id]:
+            for registry in (self.games, self.locks, self.clients):
+                del registry[game_id]
+
+async def serve(host: str = '127.0.0.1', port: int = 8765, path: str = None) -> None:
+    '''
+    Run a GameServer on a TCP port, or on a Unix socket if path is given
+    '''
+    server = GameServer()
+    if path:
+        listener = await asyncio.start_unix_server(server.handle, path=path)
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Host Flamme Rouge games.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead of TCP')
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.unix))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+# Constant-memory statistics of simulated races
+import argparse
+import itertools
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from main import POLICIES, PLAYER_COLORS, simulateRace
+
+class RunningStats():
+    '''
+    Count, mean, variance, minimum and maximum of a stream of numbers, in constant memory (Welford's algorithm).
+    Two RunningStats can be merged (Chan et al.), so every worker can reduce its own races
+    '''
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # Sum of squared differences from the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __repr__(self) -> str:
+        return f"<RunningStats n={self.count} mean={self.mean:.3f} sd={self.std:.3f}>"
+
+    def __getstate__(self) -> tuple:
+        return self.count, self.mean, self.m2, self.min, self.max
+
+    def __setstate__(self, state: tuple) -> None:
+        self.count, self.mean, self.m2, self.min, self.max = state
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: 'RunningStats') -> None:
+        '''
+        Add the values of another RunningStats to this one
+        '''
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        '''
+        Sample variance (0 with less than two values)
+        '''
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'mean': self.mean, 'std': self.std,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None}
+
+def _addCount(counts: dict, key, count: int = 1) -> None:
+    counts[key] = counts.get(key, 0) + count
+
+class RaceStats():
+    '''
+    Reducer of race results. Its size only depends on the number of seats, never on the number of races.
+        turns: race length in turns
+        by_type, by_color, by_seat: finishing turn of every rider, by rider type, color and seat (index of the player)
+        wins: races won by each seat (the seat of the first rider to arrive; seat i plays PLAYER_COLORS[i])
+        beats[a][b]: races in which the first rider of seat a arrived before every rider of seat b
+        exhaustion: {rider type: {exhaustion cards taken in a race: riders}}
+    Merge the reducers of several workers with merge()
+    '''
+    def __init__(self) -> None:
+        self.races = 0
+        self.turns = RunningStats()
+        self.by_type = {}
+        self.by_color = {}
+        self.by_seat = {}
+        self.wins = {}
+        self.beats = {}
+        self.exhaustion = {}
+
+    def __repr__(self) -> str:
+        return f"<RaceStats {self.races} races>"
+
+    def add(self, turns: int, arrivals: list, exhaustion: list) -> None:
+        '''
+        Reduce one race (as returned by main.simulateRace): arrivals is a list of (color, rider type, finishing turn) in arrival order,
+        exhaustion a list of (color, rider type, exhaustion cards taken)
+        '''
+        self.races += 1
+        self.turns.add(turns)
+        rank = {}
+        for position, (color, rider_type, turn) in enumerate(arrivals):
+            seat = PLAYER_COLORS.index(color)
+            rank.setdefault(seat, position)
+            for groups, key in ((self.by_type, rider_type), (self.by_color, color), (self.by_seat, seat)):
+                groups.setdefault(key, RunningStats()).add(turn)
+        _addCount(self.wins, PLAYER_COLORS.index(arrivals[0][0]))
+        for seat, other in itertools.permutations(rank, 2):
+            row = self.beats.setdefault(seat, {})
+            row[other] = row.get(other, 0) + (rank[seat] < rank[other])
+        for color, rider_type, count in exhaustion:
+            _addCount(self.exhaustion.setdefault(rider_type, {}), count)
+
+    def merge(self, other: 'RaceStats') -> None:
+        '''
+        Add the races of another reducer to this one
+        '''
+        self.races += other.races
+        self.turns.merge(other.turns)
+        for groups, other_groups in ((self.by_type, other.by_type), (self.by_color, other.by_color), (self.by_seat, other.by_seat)):
+            for key, stats in other_groups.items():
+                groups.setdefault(key, RunningStats()).merge(stats)
+        for seat, count in other.wins.items():
+            _addCount(self.wins, seat, count)
+        for seat, row in other.beats.items():
+            for other_seat, count in row.items():
+                _addCount(self.beats.setdefault(seat, {}), other_seat, count)
+        for rider_type, histogram in other.exhaustion.items():
+            for cards, count in histogram.items():
+                _addCount(self.exhaustion.setdefault(rider_type, {}), cards, count)
+
+    def winRates(self) -> dict:
+        '''
+        {seat: {other seat: share of races in which seat finished ahead of other seat}}
+        '''
+        return {seat: {other: count / self.races for other, count in sorted(row.items())} for seat, row in sorted(self.beats.items())}
+
+    def summary(self) -> dict:
+        '''
+        Statistics as a JSON serializable dictionary
+        '''
+        return {
+            'races': self.races,
+            'turns': self.turns.summary(),
+            'by_type': {key: stats.summary() for key, stats in sorted(self.by_type.items())},
+            'by_color': {key: stats.summary() for key, stats in sorted(self.by_color.items(), key=lambda x: PLAYER_COLORS.index(x[0]))},
+            'by_seat': {key: stats.summary() for key, stats in sorted(self.by_seat.items())},
+            'wins': {seat: count / self.races for seat, count in sorted(self.wins.items())},
+            'win_rates': self.winRates(),
+            'exhaustion': {rider_type: dict(sorted(histogram.items())) for rider_type, histogram in sorted(self.exhaustion.items())},
+        }
+
+    def report(self, width: int = 40) -> str:
+        '''
+        Text report of the summary
+        '''
+        lines = [f'{self.races} races, {self.turns.mean:.2f} turns on average (sd {self.turns.std:.2f}, {self.turns.min}-{self.turns.max})',
+                 'finishing turn:']
+        for groups in (self.by_type, self.by_color):
+            for key, stats in groups.items():
+                lines.append(f'  {key:<10} {stats.mean:>6.2f} (sd {stats.std:.2f})')
+        seats = sorted(self.beats)
+        lines.append('seat win rates (row ahead of column), overall:')
+        lines.append('       ' + ''.join(f'{PLAYER_COLORS[seat]:>8}' for seat in seats) + '  overall')
+        for seat in seats:
+            cells = ''.join(f'{"-" if other == seat else format(self.beats[seat][other]/self.races, ".1%"):>8}' for other in seats)
+            lines.append(f'  {PLAYER_COLORS[seat]:<5}{cells}  {self.wins.get(seat, 0)/self.races:>7.1%}')
+        for rider_type, histogram in sorted(self.exhaustion.items()):
+            lines.append(f'exhaustion cards taken by a {rider_type}:')
+            peak = max(histogram.values(), default=1)
+            for cards, count in sorted(histogram.items()):
+                lines.append(f"  {cards:>3} {'#'*max(1, round(count/peak*width)):<{width}} {count}")
+        return '\n'.join(lines)
+
+def _reduceChunk(args: tuple) -> 'RaceStats':
+    '''
+    Worker entry point: play a contiguous range of seeds and return their reducer
+    '''
+    course_name, player_count, policy_names, first_seed, count = args
+    stats = RaceStats()
+    for seed in range(first_seed, first_seed+count):
+        stats.add(*simulateRace(course_name, player_count, policy_names, seed)[1:])
+    return stats
+
+def runStats(course_name: str, player_count: int, races: int, policy_names: list = None, seed: int = 0, workers: int = None, chunk_size: int = 250) -> tuple:
+    '''
+    Play many seeded races (seeds seed, ..., seed+races-1) in a process pool and reduce them on the fly.
+    Chunks are submitted lazily, a few per worker at a time, so memory does not grow with the number of races.
+    Reducers are merged in seed order: results do not depend on the number of workers.
+    Returns (RaceStats, races per second)
+    '''
+    if policy_names is None:
+        policy_names = ['random'] * player_count
+    if len(policy_names) != player_count:
+        raise ValueError(f'Expected {player_count} policies, got {len(policy_names)}')
+    chunks = ((course_name, player_count, policy_names, first, min(chunk_size, seed+races-first)) for first in range(seed, seed+races, chunk_size))
+    start = time.perf_counter()
+    stats = RaceStats()
+    if workers == 1:
+        for chunk in chunks:
+            stats.merge(_reduceChunk(chunk))
+    else:
+        in_flight = 2 * (workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for chunk in itertools.chain(chunks, [None]):
+                if chunk is not None:
+                    pending.append(executor.submit(_reduceChunk, chunk))
+                # Keep every worker busy, but never more than two chunks per worker in flight
+                while pending and (chunk is None or len(pending) >= in_flight):
+                    stats.merge(pending.popleft().result())
+    elapsed = time.perf_counter() - start
+    return stats, races / elapsed if elapsed else float('inf')
+
+def main():
+    '''
+    Run a batch of headless races and print their statistics
+    '''
+    parser = argparse.ArgumentParser(description='Statistics of simulated Flamme Rouge races, in constant memory.')
+    parser.add_argument('--course', default='La Classicissima')
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--races', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: one per CPU, 1 = no pool)')
+    parser.add_argument('--policies', nargs='+', default=None, choices=list(POLICIES), help='one policy per seat (a single name is used for every seat)')
+    args = parser.parse_args()
+
+    policy_names = args.policies
+    if policy_names and len(policy_names) == 1:
+        policy_names = policy_names * args.players
+    stats, races_per_second = runStats(args.course, args.players, args.races, policy_names, args.seed, args.workers)
+    print(f'{args.course} ({args.players} players): {races_per_second:.1f} races/s')
+    print(stats.report())
+
+
+if __name__ == '__main__':
+    main()
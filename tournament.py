@@ -0,0 +1,129 @@
+# Round robin tournament between registered policies
+import argparse
+import itertools
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bots import MCTSPolicy, registerPolicies
+from main import POLICIES, PLAYER_COLORS, getCourses, getLayout, simulateRace
+
+# Every computer player can take part (worker processes import this module too, so they know the same names)
+registerPolicies()
+
+# Policies played by default (search based computer players are too slow for thousands of games)
+DEFAULT_POLICIES = [name for name, policy in POLICIES.items() if policy is not MCTSPolicy]
+
+def playerCounts(course_name: str, count_range: str) -> list:
+    '''
+    Smallest and largest number of players of a course variant, keeping only counts for which every rider fits
+    on the start and breakaway spaces
+    '''
+    layout = getLayout(tuple(getCourses()[course_name][count_range]))
+    room = layout.startRoom()
+    low, high = (int(count) for count in count_range.split('-'))
+    return sorted({count for count in (low, high) if count*2 <= room} or {max(count for count in range(low, high+1) if count*2 <= room)})
+
+def buildShards(policy_names: list, games: int, seed: int, courses: list = None) -> list:
+    '''
+    Every pairing of policies, on every course and player count variant, in both seatings (A, B, A, ... and B, A, B, ...).
+    Each shard plays the same seeds (seed, ..., seed+games-1), so pairings are compared on identical decks
+    '''
+    shards = []
+    for course_name, variants in getCourses().items():
+        if courses and course_name not in courses:
+            continue
+        for count_range in variants:
+            for player_count in playerCounts(course_name, count_range):
+                for first, second in itertools.combinations(policy_names, 2):
+                    for seating in ((first, second), (second, first)):
+                        seats = [seating[i % 2] for i in range(player_count)]
+                        shards.append({'course': course_name, 'players': player_count, 'seats': seats, 'seed': seed, 'games': games})
+    return shards
+
+def shardName(shard: dict) -> str:
+    name = f"{shard['course']}-{shard['players']}p-{'-'.join(shard['seats'])}-{shard['seed']}-{shard['games']}"
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', name) + '.json'
+
+def playShard(shard: dict) -> dict:
+    '''
+    Worker entry point: play every game of a shard
+    '''
+    start = time.perf_counter()
+    games = []
+    for seed in range(shard['seed'], shard['seed']+shard['games']):
+        seed, turns, arrivals, _ = simulateRace(shard['course'], shard['players'], shard['seats'], seed)
+        games.append({'seed': seed, 'turns': turns, 'arrivals': [[PLAYER_COLORS.index(color), rider_type, turn] for color, rider_type, turn in arrivals]})
+    return dict(shard, results=games, seconds=time.perf_counter() - start)
+
+def _writeShard(path: str, data: dict) -> None:
+    '''
+    Write a shard atomically (an interrupted write never leaves a complete-looking file)
+    '''
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+def runTournament(out_dir: str, policy_names: list = None, games: int = 50, seed: int = 0, workers: int = None, courses: list = None) -> tuple:
+    '''
+    Play every shard that is not in out_dir yet, in a process pool, writing each shard as soon as it is done.
+    Returns (number of shards played, number of shards skipped)
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    shards = buildShards(policy_names or DEFAULT_POLICIES, games, seed, courses)
+    todo = [shard for shard in shards if not os.path.exists(os.path.join(out_dir, shardName(shard)))]
+    if workers == 1:
+        for shard in todo:
+            _writeShard(os.path.join(out_dir, shardName(shard)), playShard(shard))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for future in as_completed([executor.submit(playShard, shard) for shard in todo]):
+                data = future.result()
+                _writeShard(os.path.join(out_dir, shardName(data)), data)
+    return len(todo), len(shards) - len(todo)
+
+def summarize(out_dir: str) -> dict:
+    '''
+    Aggregate every shard of a directory: {(policy A, policy B): {policy: wins, 'games': n}}.
+    The winner of a game is the policy of the seat of the first rider to arrive
+    '''
+    table = {}
+    for filename in sorted(os.listdir(out_dir)):
+        if not filename.endswith('.json'):
+            continue
+        with open(os.path.join(out_dir, filename)) as f:
+            shard = json.load(f)
+        pairing = tuple(sorted(set(shard['seats'])))
+        row = table.setdefault(pairing, dict.fromkeys(pairing, 0))
+        row['games'] = row.get('games', 0) + len(shard['results'])
+        for game in shard['results']:
+            row[shard['seats'][game['arrivals'][0][0]]] += 1
+    return table
+
+def main():
+    '''
+    Run (or resume) a tournament and print the win rates of every pairing
+    '''
+    parser = argparse.ArgumentParser(description='Round robin tournament between Flamme Rouge policies on every course.')
+    parser.add_argument('--out', default='tournament', help='directory of the shards (completed shards are not played again)')
+    parser.add_argument('--policies', nargs='+', default=None, choices=list(POLICIES), help=f'default: {" ".join(DEFAULT_POLICIES)}')
+    parser.add_argument('--courses', nargs='+', default=None, choices=list(getCourses()), help='default: every course')
+    parser.add_argument('--games', type=int, default=50, help='games per shard (pairing, course, player count and seating)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: one per CPU, 1 = no pool)')
+    parser.add_argument('--summary', action='store_true', help='only print the results found in --out')
+    args = parser.parse_args()
+
+    if not args.summary:
+        start = time.perf_counter()
+        played, skipped = runTournament(args.out, args.policies, args.games, args.seed, args.workers, args.courses)
+        print(f'{played} shards played ({played*args.games} games) in {time.perf_counter()-start:.1f} s, {skipped} already done')
+    for pairing, row in summarize(args.out).items():
+        print(f"{' vs '.join(pairing)} ({row['games']} games): " + ', '.join(f'{name} {row[name]/row["games"]:.1%}' for name in pairing))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+# Lockstep simulation of many races with NumPy
+import time
+
+import numpy as np
+
+from main import Course, PLAYER_COLORS, _countRange
+
+# Widest space in any tile
+MAX_LANES = 3
+# Grid value of an empty lane
+EMPTY = -1
+# A rider never holds more than its 15 starting cards (each exhaustion card taken replaces a card played before)
+DECK_CAPACITY = 16
+HAND_SIZE = 4
+
+SPRINTEUR_DECK = [2, 3, 4, 5, 9] * 3
+ROULEUR_DECK = [3, 4, 5, 6, 7] * 3
+
+def _randomCard(hand: np.ndarray, hand_len: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    return (rng.random(hand_len.shape) * hand_len).astype(np.int64)
+
+def _greedyCard(hand: np.ndarray, hand_len: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    values = np.where(hand == -1, 2, hand)
+    values[np.arange(HAND_SIZE) >= hand_len[..., None]] = -100
+    return values.argmax(-1)
+
+def _lazyCard(hand: np.ndarray, hand_len: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    values = hand.astype(np.int64)
+    values[np.arange(HAND_SIZE) >= hand_len[..., None]] = 100
+    return values.argmin(-1)
+
+# Batched versions of the registered policies in main.POLICIES (same choices for the same hand)
+VECTOR_POLICIES = {'random': _randomCard, 'greedy': _greedyCard, 'lazy': _lazyCard}
+
+class RaceBatch():
+    '''
+    Advances many independent races on the same course layout in lockstep.
+    The whole state is stored in NumPy arrays with one row per race:
+        grid: rider id (or EMPTY) of every (race, space, lane), occupancy: number of riders of every (race, space)
+        pos / lane: location of every (race, rider). Rider ids are 2*seat (sprinteur) and 2*seat+1 (rouleur)
+        draw / discard / hand: cards of every (race, rider), with their lengths (and a cursor for the draw deck)
+    Every phase of a turn (card choice, movement with min/max power, placement, slipstream, finish line, exhaustion, draw)
+    is a batched array operation. The rules are the same as Course and Race in main.py:
+    with the same decks and card choices, each race ends exactly like the object model.
+    Decks are shuffled by NumPy's generator, so results match main.runBatch in distribution, not race by race.
+    '''
+    def __init__(self, course_name: str, player_count: int, races: int, policy_names: list = None, seed: int = None, max_turns: int = 200) -> None:
+        self.course_name = course_name
+        self.player_count = player_count
+        self.policy_names = policy_names or ['random'] * player_count
+        if len(self.policy_names) != player_count:
+            raise ValueError(f'Expected {player_count} policies, got {len(self.policy_names)}')
+        self.rng = np.random.default_rng(seed)
+        self.max_turns = max_turns
+        self._setLayout(Course(course_name, _countRange(player_count)))
+        self.races = races
+        self.riders = 2 * player_count
+        N, R = races, self.riders
+
+        # Board
+        self.grid = np.full((N, self.size, MAX_LANES), EMPTY, dtype=np.int8)
+        self.occupancy = np.zeros((N, self.size), dtype=np.int8) # Number of riders on every (race, space)
+        self.pos = np.full((N, R), -1, dtype=np.int16)
+        self.lane = np.zeros((N, R), dtype=np.int8)
+        # Finish bookkeeping
+        self.done = np.zeros((N, R), dtype=bool)
+        self.finish_turn = np.zeros((N, R), dtype=np.int16)
+        self.arrival = np.full((N, R), -1, dtype=np.int8)
+        self.ended = np.zeros(N, dtype=bool)
+        self.turns = np.zeros(N, dtype=np.int16)
+        self.turn = 0
+        self.exhaustion = np.zeros((N, R), dtype=np.int16) # Exhaustion cards taken by every rider
+
+        # Decks (shuffled with random sort keys)
+        decks = np.array([SPRINTEUR_DECK, ROULEUR_DECK] * player_count, dtype=np.int8)
+        self.draw = np.zeros((N, R, DECK_CAPACITY), dtype=np.int8)
+        self.draw[:, :, :15] = np.take_along_axis(np.broadcast_to(decks, (N, R, 15)), self.rng.random((N, R, 15)).argsort(-1), -1)
+        self.draw_head = np.zeros((N, R), dtype=np.int8)
+        self.draw_len = np.full((N, R), 15, dtype=np.int8)
+        self.discard = np.zeros((N, R, DECK_CAPACITY), dtype=np.int8)
+        self.discard_len = np.zeros((N, R), dtype=np.int8)
+        self.hand = np.zeros((N, R, HAND_SIZE), dtype=np.int8)
+        self.hand_len = np.zeros((N, R), dtype=np.int8)
+        self._drawCards(np.ones((N, R), dtype=bool))
+
+    def __repr__(self) -> str:
+        return f"<RaceBatch {self.races} races on '{self.course_name}' - turn {self.turn}>"
+
+    def _setLayout(self, course: 'Course') -> None:
+        '''
+        Static arrays describing the spaces of the course (from its shared CourseLayout)
+        '''
+        layout = course.layout
+        self.size = layout.size
+        self.lanes = np.array(layout.lanes, dtype=np.int8)
+        self.lane_ok = np.arange(MAX_LANES) < self.lanes[:, None] # Lanes that exist on each space
+        self.min_pw = np.array(layout.min_pw, dtype=np.int16)
+        self.max_pw = np.array(layout.max_pw, dtype=np.int16)
+        self.slip = np.array(layout.slip, dtype=bool)
+        self.finish = np.array(layout.is_finish, dtype=bool)
+        self.start = np.zeros(self.size, dtype=bool)
+        self.start[list(layout.start)] = True
+        self.breakaway = np.zeros(self.size, dtype=bool)
+        self.breakaway[list(layout.breakaway)] = True
+
+    def _orderKey(self) -> np.ndarray:
+        '''
+        Sort key of every rider (higher == moves first), same order as Course.riders
+        '''
+        return self.pos.astype(np.int32) * 4 + (3 - self.lane)
+
+    # Cards
+    def _drawCards(self, mask: np.ndarray) -> None:
+        '''
+        Draw a new hand for every (race, rider) in mask, reshuffling the discard deck when the draw deck is empty
+        '''
+        self.hand_len[mask] = 0
+        # Usual case: enough cards left, take the next four at once
+        full = mask & (self.draw_len - self.draw_head >= HAND_SIZE)
+        rows, riders = np.nonzero(full)
+        cards = self.draw_head[rows, riders][:, None] + np.arange(HAND_SIZE)
+        self.hand[rows, riders] = self.draw[rows[:, None], riders[:, None], cards]
+        self.draw_head[rows, riders] += HAND_SIZE
+        self.hand_len[rows, riders] = HAND_SIZE
+        mask = mask & ~full
+        for _ in range(HAND_SIZE):
+            empty = mask & (self.draw_head == self.draw_len)
+            if empty.any():
+                self._reshuffle(empty)
+            drawing = mask & (self.draw_head < self.draw_len)
+            rows, riders = np.nonzero(drawing)
+            self.hand[rows, riders, self.hand_len[rows, riders]] = self.draw[rows, riders, self.draw_head[rows, riders]]
+            self.draw_head[rows, riders] += 1
+            self.hand_len[rows, riders] += 1
+        # Nothing left at all: play an exhaustion card
+        broke = mask & (self.hand_len == 0)
+        self.hand[broke, 0] = -1
+        self.hand_len[broke] = 1
+
+    def _reshuffle(self, mask: np.ndarray) -> None:
+        rows, riders = np.nonzero(mask)
+        sizes = self.discard_len[rows, riders]
+        keys = self.rng.random((len(rows), DECK_CAPACITY))
+        keys[np.arange(DECK_CAPACITY) >= sizes[:, None]] = 2 # Empty slots go last
+        self.draw[rows, riders] = np.take_along_axis(self.discard[rows, riders], keys.argsort(-1), -1)
+        self.draw_head[rows, riders] = 0
+        self.draw_len[rows, riders] = sizes
+        self.discard_len[rows, riders] = 0
+
+    def _discard(self, rows: np.ndarray, riders: np.ndarray, cards: np.ndarray) -> None:
+        self.discard[rows, riders, self.discard_len[rows, riders]] = cards
+        self.discard_len[rows, riders] += 1
+
+    def chooseCards(self) -> np.ndarray:
+        '''
+        Index of the card every rider plays this turn, according to the policy of its seat
+        '''
+        choice = np.zeros((self.races, self.riders), dtype=np.int64)
+        for seat, policy_name in enumerate(self.policy_names):
+            seat_riders = slice(2*seat, 2*seat+2)
+            choice[:, seat_riders] = VECTOR_POLICIES[policy_name](self.hand[:, seat_riders], self.hand_len[:, seat_riders], self.rng)
+        return choice
+
+    def playCards(self, choice: np.ndarray) -> np.ndarray:
+        '''
+        Play the chosen card of every active rider and discard the rest of its hand.
+        Returns the movement value of every (race, rider) (0 == not playing)
+        '''
+        active = ~self.done & ~self.ended[:, None]
+        rows, riders = np.nonzero(active)
+        chosen = choice[rows, riders]
+        cards = self.hand[rows, riders, chosen]
+        played = np.zeros((self.races, self.riders), dtype=np.int16)
+        played[rows, riders] = np.where(cards == -1, 2, cards)
+        for j in range(HAND_SIZE):
+            keep = (j < self.hand_len[rows, riders]) & (j != chosen)
+            self._discard(rows[keep], riders[keep], self.hand[rows[keep], riders[keep], j])
+        self.hand_len[rows, riders] = 0
+        return played
+
+    # Board
+    def _place(self, rows: np.ndarray, riders: np.ndarray, target: np.ndarray) -> None:
+        '''
+        Same as Course._placeRider for one rider per race (rows must be unique):
+        first free lane of target space, or of the closest space before it (never behind the rider's current space)
+        '''
+        origin = self.pos[rows, riders].astype(np.int64)
+        origin_lane = self.lane[rows, riders].astype(np.int64)
+        target = target.astype(np.int64)
+        new_lane = np.zeros(len(rows), dtype=np.int64)
+        moved = np.zeros(len(rows), dtype=bool)
+        pending = np.nonzero(target > origin)[0]
+        while len(pending):
+            free = (self.grid[rows[pending], target[pending]] == EMPTY) & self.lane_ok[target[pending]]
+            found = free.any(1)
+            got = pending[found]
+            new_lane[got] = free[found].argmax(1)
+            moved[got] = True
+            pending = pending[~found]
+            target[pending] -= 1
+            pending = pending[target[pending] > origin[pending]]
+
+        rows, riders, target, new_lane = rows[moved], riders[moved], target[moved], new_lane[moved]
+        origin, origin_lane = origin[moved], origin_lane[moved]
+        self.grid[rows, target, new_lane] = riders
+        self.occupancy[rows, target] += 1
+        on_board = origin >= 0
+        self._vacate(rows[on_board], origin[on_board], origin_lane[on_board])
+        self.occupancy[rows[on_board], origin[on_board]] -= 1
+        self.pos[rows, riders] = target
+        self.lane[rows, riders] = new_lane
+
+    def _vacate(self, rows: np.ndarray, spaces: np.ndarray, lanes: np.ndarray) -> None:
+        '''
+        Same as Course._updateSpace: empty a lane and move the riders on the lanes to its left one lane to the right
+        '''
+        cells = self.grid[rows, spaces]
+        shifted = np.concatenate([cells[:, 1:], np.full((len(rows), 1), EMPTY, dtype=np.int8)], axis=1)
+        moving = np.arange(MAX_LANES) >= lanes[:, None]
+        cells = np.where(moving, shifted, cells)
+        self.grid[rows, spaces] = cells
+        update = moving & (cells != EMPTY)
+        self.lane[np.broadcast_to(rows[:, None], cells.shape)[update], cells[update]] = np.broadcast_to(np.arange(MAX_LANES), cells.shape)[update]
+
+    def placeRiders(self) -> None:
+        '''
+        Random initial placement (as Policy.placeRider), seat by seat, on start spaces or on the breakaway space
+        (whose last lane is never used)
+        '''
+        for rider in range(self.riders):
+            occupied = self.occupancy
+            valid = (self.start & (occupied < self.lanes)) | (self.breakaway & (occupied < self.lanes-1))
+            target = (self.rng.random(valid.shape) * valid).argmax(1)
+            rows = np.arange(self.races)
+            self._place(rows, np.full(self.races, rider), target)
+
+    def moveRiders(self, played: np.ndarray) -> None:
+        '''
+        Move riders front to back (Course.moveRider), one rank of the movement order at a time in every race
+        '''
+        order = np.argsort(-np.where(played > 0, self._orderKey(), -1), axis=1, kind='stable')
+        for k in range(self.riders):
+            riders = order[:, k]
+            rows = np.nonzero(played[np.arange(self.races), riders] > 0)[0]
+            if not len(rows):
+                break
+            riders = riders[rows]
+            origin = self.pos[rows, riders]
+            delta = np.clip(played[rows, riders], self.min_pw[origin], self.max_pw[origin])
+            self._place(rows, riders, np.minimum(origin + delta, self.size-1))
+
+    def applySlip(self) -> None:
+        '''
+        Same as Course._applySlip. In every race, the rearmost peloton that can slipstream
+        (one empty space before the next peloton, which must allow slipstream, and its front rider not on a no-slip space)
+        moves its riders one space, front to back, until a rider on a no-slip space stops the rest. Repeat until nothing moves.
+        '''
+        spaces = np.arange(self.size)
+        # Only races where a peloton moved in the previous round can have a new one to move
+        rows = np.nonzero(~self.ended)[0]
+        while len(rows):
+            occupied = self.occupancy[rows] > 0
+            eligible = np.zeros_like(occupied)
+            eligible[:, :-2] = occupied[:, :-2] & ~occupied[:, 1:-1] & occupied[:, 2:] & self.slip[2:] & self.slip[:-2]
+            has_eligible = eligible.any(1)
+            rows, occupied, eligible = rows[has_eligible], occupied[has_eligible], eligible[has_eligible]
+            if not len(rows):
+                return
+            end = eligible.argmax(1)
+            # Peloton starts right after the last empty space before its end
+            last_empty = np.maximum.accumulate(np.where(occupied, -1, spaces), axis=1)
+            start = last_empty[np.arange(len(rows)), end] + 1
+            pos = self.pos[rows]
+            in_peloton = ~self.done[rows] & (pos >= start[:, None]) & (pos <= end[:, None])
+            order = np.argsort(-np.where(in_peloton, self._orderKey()[rows], -1), axis=1, kind='stable')
+            count = in_peloton.sum(1)
+            stopped = np.zeros(len(rows), dtype=bool)
+            for k in range(count.max()):
+                go = np.nonzero((k < count) & ~stopped)[0]
+                riders = order[go, k]
+                space = self.pos[rows[go], riders]
+                blocked = ~self.slip[space]
+                stopped[go[blocked]] = True
+                go, riders, space = go[~blocked], riders[~blocked], space[~blocked]
+                self._place(rows[go], riders, np.minimum(space + 1, self.size-1))
+
+    def _checkFinish(self) -> None:
+        '''
+        Riders on a finish space are ranked (front to back) and taken off the board. Races end when all but one rider finished
+        '''
+        new = ~self.done & ~self.ended[:, None] & (self.pos >= 0) & self.finish[np.maximum(self.pos, 0)]
+        if new.any():
+            order = np.argsort(-np.where(new, self._orderKey(), -1), axis=1, kind='stable')
+            rank = np.empty_like(order)
+            np.put_along_axis(rank, order, np.arange(self.riders), axis=1)
+            arrival = self.done.sum(1, keepdims=True) + rank
+            self.arrival[new] = arrival[new]
+            self.finish_turn[new] = self.turn
+            rows, riders = np.nonzero(new)
+            self.grid[rows, self.pos[rows, riders], self.lane[rows, riders]] = EMPTY
+            np.subtract.at(self.occupancy, (rows, self.pos[rows, riders]), 1) # Several riders can finish on the same space
+            self.done |= new
+        over = ~self.ended & (self.done.sum(1) >= self.riders-1)
+        self.turns[over] = self.turn
+        self.ended |= over
+
+    def _applyExhaustion(self) -> None:
+        '''
+        Riders with an empty lane ahead take an exhaustion card (Course._applyExhaustion)
+        '''
+        active = ~self.done & ~self.ended[:, None]
+        ahead = np.minimum(self.pos + 1, self.size-1)
+        lane_ahead = np.minimum(self.lane, self.lanes[ahead]-1)
+        rows = np.arange(self.races)[:, None]
+        tired = active & (self.pos + 1 <= self.size-1) & (self.grid[rows, ahead, lane_ahead] == EMPTY)
+        rows, riders = np.nonzero(tired)
+        self.exhaustion[rows, riders] += 1
+        self._discard(rows, riders, np.full(len(rows), -1, dtype=np.int8))
+
+    def resolveCards(self, played: np.ndarray) -> None:
+        '''
+        Everything that happens in a turn after the cards are played (see Race.resolveCards)
+        '''
+        self.moveRiders(played)
+        self.applySlip()
+        self._checkFinish()
+        active = ~self.done & ~self.ended[:, None]
+        self._applyExhaustion()
+        self._drawCards(active)
+
+    def playTurn(self) -> bool:
+        '''
+        Play one turn in every race that is still running. Return True when all races are over
+        '''
+        self.turn += 1
+        self.resolveCards(self.playCards(self.chooseCards()))
+        return bool(self.ended.all())
+
+    def run(self) -> None:
+        self.placeRiders()
+        while not self.playTurn():
+            if self.turn >= self.max_turns:
+                raise RuntimeError(f'{self} did not end after {self.max_turns} turns')
+
+    def results(self) -> list:
+        '''
+        Same format as main.simulateRace: (race index, number of turns, list of (color, rider type, finishing turn) in arrival order,
+        list of (color, rider type, exhaustion cards taken) in seat order)
+        '''
+        results = []
+        for race in range(self.races):
+            finished = sorted(np.nonzero(self.done[race])[0], key=lambda rider: self.arrival[race, rider])
+            results.append((race, int(self.turns[race]), [(PLAYER_COLORS[rider//2], ('sprinteur', 'rouleur')[rider % 2], int(self.finish_turn[race, rider])) for rider in finished],
+                            [(PLAYER_COLORS[rider//2], ('sprinteur', 'rouleur')[rider % 2], int(self.exhaustion[race, rider])) for rider in range(self.riders)]))
+        return results
+
+def runBatch(course_name: str, player_count: int, races: int, policy_names: list = None, seed: int = 0, batch_size: int = 10000) -> tuple:
+    '''
+    Vectorized counterpart of main.runBatch (single process).
+    Returns (list of results, races per second)
+    '''
+    start = time.perf_counter()
+    results = []
+    rng = np.random.default_rng(seed)
+    for first in range(0, races, batch_size):
+        batch = RaceBatch(course_name, player_count, min(batch_size, races-first), policy_names, seed=rng.integers(2**63))
+        batch.run()
+        results.extend((first + race, turns, positions, exhaustion) for race, turns, positions, exhaustion in batch.results())
+    elapsed = time.perf_counter() - start
+    return results, races / elapsed if elapsed else float('inf')